@@ -0,0 +1,255 @@
+"""
+pyp5 - aletable
+Column-selective ALE reader and filter expressions on its rows.
+
+Only the requested columns of an ALE are kept, as one list of values per
+column, so a 20,000 row log with dozens of columns stays small. Filters
+pick rows before anything is searched on the P5 server:
+
+    ale_filter = aletable.Filter("Circled = Y and Tape in (A001, A002)")
+    table = aletable.read_ale("list.ale", ["Source File"] + ale_filter.columns)
+    rows = ale_filter.select(table)
+
+Expressions combine comparisons of a column with a value by and, or, not
+and parentheses. Column names and values containing spaces or operator
+characters are quoted with ' or ":
+
+    =, !=       equal, not equal (ignoring case)
+    ~, !~       glob match like 'A00*' (ignoring case)
+    <, <=, >, >=  numbers if both sides are numbers, text otherwise
+                  (timecodes of the same format compare fine)
+    in (...)    one of a comma separated list of values
+"""
+
+from collections import namedtuple
+from fnmatch import fnmatchcase
+import operator
+import re
+import sys
+
+
+AleTable = namedtuple("AleTable", "heading columns rows")
+
+TOKEN = re.compile(
+    r"""\s*(?:(?P<op>!=|!~|<=|>=|=|~|<|>|\(|\)|,)"""
+    r"""|'(?P<single>[^']*)'|"(?P<double>[^"]*)"|(?P<word>[^\s()=!~<>,'"]+))"""
+)
+KEYWORDS = ("and", "or", "not", "in")
+ORDER = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def read_ale(file, columns=None) -> AleTable:
+    """Read heading and supplied columns (all if None) of ALE file.
+    Column names are matched ignoring case, values are returned under the
+    requested names. Raises IOError if file can't be read, ValueError if a
+    requested column is missing."""
+    heading = {}
+    wanted = None
+    values = {}
+    rows = 0
+    section = "HEADING"
+
+    with open(file, "r", encoding="utf-8") as ale_file:
+        for line in ale_file:
+            line = line.rstrip("\r\n")
+
+            # --- section names stand on a line of their own
+            if line in ("Heading", "Column", "Data"):
+                section = line.upper()
+                if section == "DATA" and wanted is None:
+                    raise ValueError("No column line found.")
+                continue
+
+            if section == "HEADING" and line:
+                key, _, value = line.partition("\t")
+                heading[key.strip()] = value.strip()
+            elif section == "COLUMN" and wanted is None and line:
+                wanted = _column_indexes(line, columns)
+                values = {name: [] for name in wanted}
+            elif section == "DATA" and line:
+                fields = line.split("\t")
+                for name, index in wanted.items():
+                    value = fields[index].strip() if index < len(fields) else ""
+                    values[name].append(sys.intern(value))
+                rows += 1
+
+    if wanted is None:
+        raise ValueError("No column line found.")
+    return AleTable(heading, values, rows)
+
+
+def _column_indexes(line, columns) -> dict:
+    """requested column name: index in column line"""
+    names = [name.strip() for name in line.split("\t")]
+    if columns is None:
+        return {name: index for index, name in enumerate(names) if name}
+
+    indexes = {}
+    for index, name in reversed(list(enumerate(names))):
+        indexes[name.casefold()] = index
+    wanted = {}
+    for name in columns:
+        if any(name.casefold() == known.casefold() for known in wanted):
+            continue
+        if name.casefold() not in indexes:
+            raise ValueError(f"No '{name}' column found.")
+        wanted[name] = indexes[name.casefold()]
+    return wanted
+
+
+def number(value):
+    """value as float, None if it is no number"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class Filter:
+    """compiled filter expression on ALE rows"""
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.columns = []
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+        self.test = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(
+                f"Filter: unexpected '{self.tokens[self.position][1]}'"
+            )
+
+    @staticmethod
+    def tokenize(expression) -> list:
+        """list of (kind, text), kind is op, word, keyword or value"""
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = TOKEN.match(expression, position)
+            if match is None:
+                raise ValueError(f"Filter: can't read '{expression[position:]}'")
+            position = match.end()
+            if match.group("op"):
+                tokens.append(("op", match.group("op")))
+            elif match.group("word") is not None:
+                word = match.group("word")
+                kind = "keyword" if word.lower() in KEYWORDS else "word"
+                tokens.append((kind, word.lower() if kind == "keyword" else word))
+            else:
+                quoted = match.group("single")
+                if quoted is None:
+                    quoted = match.group("double")
+                tokens.append(("value", quoted))
+        if not tokens:
+            raise ValueError("Filter: empty expression")
+        return tokens
+
+    def peek(self):
+        """current token, (None, None) at the end"""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def take(self, kind=None, text=None) -> str:
+        """consume current token, raises ValueError if it doesn't fit"""
+        current_kind, current_text = self.peek()
+        if current_kind is None:
+            raise ValueError(f"Filter: incomplete expression '{self.expression}'")
+        if (kind and current_kind != kind) or (text and current_text != text):
+            raise ValueError(f"Filter: unexpected '{current_text}'")
+        self.position += 1
+        return current_text
+
+    def take_value(self) -> str:
+        """consume column name or value, bare or quoted"""
+        kind, text = self.peek()
+        if kind not in ("word", "value"):
+            return self.take("value")
+        self.position += 1
+        return text
+
+    def parse_or(self):
+        tests = [self.parse_and()]
+        while self.peek() == ("keyword", "or"):
+            self.take()
+            tests.append(self.parse_and())
+        if len(tests) == 1:
+            return tests[0]
+        return lambda row: any(test(row) for test in tests)
+
+    def parse_and(self):
+        tests = [self.parse_not()]
+        while self.peek() == ("keyword", "and"):
+            self.take()
+            tests.append(self.parse_not())
+        if len(tests) == 1:
+            return tests[0]
+        return lambda row: all(test(row) for test in tests)
+
+    def parse_not(self):
+        if self.peek() == ("keyword", "not"):
+            self.take()
+            test = self.parse_not()
+            return lambda row: not test(row)
+        if self.peek() == ("op", "("):
+            self.take()
+            test = self.parse_or()
+            self.take("op", ")")
+            return test
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        column = self.take_value()
+        key = column.casefold()
+        if not any(key == known.casefold() for known in self.columns):
+            self.columns.append(column)
+
+        kind, text = self.peek()
+        if (kind, text) == ("keyword", "in"):
+            self.take()
+            self.take("op", "(")
+            choices = {self.take_value().casefold()}
+            while self.peek() == ("op", ","):
+                self.take()
+                choices.add(self.take_value().casefold())
+            self.take("op", ")")
+            return lambda row: row(key).casefold() in choices
+
+        comparison = self.take("op")
+        value = self.take_value()
+        wanted = value.casefold()
+        if comparison == "=":
+            return lambda row: row(key).casefold() == wanted
+        if comparison == "!=":
+            return lambda row: row(key).casefold() != wanted
+        if comparison == "~":
+            return lambda row: fnmatchcase(row(key).casefold(), wanted)
+        if comparison == "!~":
+            return lambda row: not fnmatchcase(row(key).casefold(), wanted)
+        if comparison in ORDER:
+            compare = ORDER[comparison]
+            wanted_number = number(value)
+
+            def test(row):
+                current = row(key)
+                current_number = number(current)
+                if wanted_number is not None and current_number is not None:
+                    return compare(current_number, wanted_number)
+                return compare(current, value)
+
+            return test
+        raise ValueError(f"Filter: unexpected '{comparison}'")
+
+    def select(self, table) -> list:
+        """indexes of table rows matching filter"""
+        columns = {name.casefold(): values for name, values in table.columns.items()}
+        for name in self.columns:
+            if name.casefold() not in columns:
+                raise ValueError(f"No '{name}' column found.")
+
+        result = []
+        for index in range(table.rows):
+            if self.test(lambda key, index=index: columns[key][index]):
+                result.append(index)
+        return result
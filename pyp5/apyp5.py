@@ -0,0 +1,402 @@
+"""
+pyp5 - asyncio
+asyncio variant of the nsdchat functions in pyp5.
+
+Commands run on a pool of interactive nsdchat processes started with
+asyncio subprocesses, so hundreds of lookups can be in flight from a single
+thread. A semaphore limits how many commands run at once (one per nsdchat
+process), every call accepts a timeout, counted once a session is free.
+Replies are framed by "echo <marker>" like in session.py, nsdchat versions
+not echoing the marker fall back to one line per command.
+
+    async def main():
+        selection = (await apyp5.new_restore_selection(nsdchat)).strip()
+        results = await apyp5.find_entries(nsdchat, selection, archive_id, items)
+        await apyp5.close_all()
+"""
+
+import asyncio
+import itertools
+import os
+import pyp5
+from session import PROBE_TIMEOUT, SessionError, quote
+
+
+LIMIT = 8
+TIMEOUT = 30
+
+_pools = {}
+_framing = {}
+
+
+class AsyncSession:
+    """single interactive nsdchat process driven by asyncio"""
+
+    def __init__(self, process, framed=False):
+        self.process = process
+        self.framed = framed
+        self.prefix = f"pyp5-{os.getpid()}-{id(self):x}-"
+        self.counter = itertools.count()
+
+    @classmethod
+    async def start(cls, nsdchat):
+        """Start nsdchat process. The first session of a command line checks
+        if nsdchat echoes reply markers, a silent nsdchat is started again
+        without them, a late reply would shift all later replies."""
+        key = tuple(nsdchat)
+        session = cls(await cls.spawn(nsdchat), _framing.get(key, False))
+        if key in _framing:
+            return session
+
+        marker = session.marker()
+        await session.write([("echo", marker)])
+        try:
+            line = await asyncio.wait_for(session.readline(), PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            session.kill()
+            await session.process.wait()
+            _framing[key] = False
+            return cls(await cls.spawn(nsdchat))
+        except SessionError as error:
+            # --- nothing but the probe was sent, the pool may retry
+            error.sent = False
+            raise
+        session.framed = _framing[key] = line.strip() == marker
+        return session
+
+    @staticmethod
+    async def spawn(nsdchat):
+        """start nsdchat process with piped stdin and stdout"""
+        return await asyncio.create_subprocess_exec(
+            *nsdchat,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    def alive(self) -> bool:
+        """check if nsdchat process is still running"""
+        return self.process.returncode is None
+
+    def marker(self) -> str:
+        """unique marker ending the reply of a single command"""
+        return f"{self.prefix}{next(self.counter)}"
+
+    async def write(self, commands):
+        """write commands to nsdchat"""
+        lines = "".join(
+            " ".join(quote(arg) for arg in args) + "\n" for args in commands
+        )
+        try:
+            self.process.stdin.write(lines.encode("utf-8"))
+            await self.process.stdin.drain()
+        except OSError as error:
+            raise SessionError(f"nsdchat session closed: {error}") from error
+
+    async def readline(self) -> str:
+        """next line of output, raises SessionError if nsdchat exited"""
+        line = await self.process.stdout.readline()
+        if not line and self.process.stdout.at_eof():
+            raise SessionError("nsdchat exited", sent=True)
+        return line.decode("utf-8")
+
+    async def run(self, args) -> str:
+        """send command to nsdchat, returns reply including trailing newline"""
+        if not self.framed:
+            await self.write([args])
+            return await self.readline()
+
+        marker = self.marker()
+        await self.write([args, ("echo", marker)])
+        lines = []
+        while True:
+            line = await self.readline()
+            if line.strip() == marker:
+                return "".join(lines)
+            lines.append(line)
+
+    async def close(self):
+        """ask nsdchat to exit, kill it if it does not"""
+        if self.alive():
+            try:
+                self.process.stdin.write(b"exit\n")
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), TIMEOUT)
+                return
+            except (OSError, asyncio.TimeoutError):
+                pass
+        self.kill()
+        await self.process.wait()
+
+    def kill(self):
+        """kill nsdchat process right away"""
+        if self.alive():
+            self.process.kill()
+
+
+class AsyncSessionPool:
+    """up to limit nsdchat sessions, one command per session at a time"""
+
+    def __init__(self, nsdchat, limit=LIMIT):
+        self.nsdchat = list(nsdchat)
+        self.limit = asyncio.Semaphore(max(1, limit))
+        self.idle = []
+
+    async def run(self, args, timeout=TIMEOUT) -> str:
+        """Run single command on a pooled session, raises asyncio.TimeoutError
+        if it is not answered within timeout seconds once a session is free.
+        On timeout or cancel the session is killed, as its reply would be
+        read by the next command otherwise."""
+        async with self.limit:
+            for attempt in range(2):
+                session = self.idle.pop() if self.idle else None
+                if session is None or not session.alive():
+                    session = await AsyncSession.start(self.nsdchat)
+                try:
+                    reply = await asyncio.wait_for(session.run(args), timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    session.kill()
+                    raise
+                except SessionError as error:
+                    session.kill()
+                    # --- never repeat a command that may have reached the server
+                    if attempt or error.sent:
+                        raise
+                    continue
+                self.idle.append(session)
+                return reply
+        raise SessionError("could not start nsdchat session")
+
+    async def close(self):
+        """terminate all idle sessions"""
+        sessions, self.idle = self.idle, []
+        await asyncio.gather(*(session.close() for session in sessions))
+
+
+def get_pool(nsdchat) -> AsyncSessionPool:
+    """return shared pool of running event loop for nsdchat command line"""
+    key = (id(asyncio.get_running_loop()), tuple(nsdchat))
+    if key not in _pools:
+        _pools[key] = AsyncSessionPool(nsdchat)
+    return _pools[key]
+
+
+async def gather(*aws) -> list:
+    """Like asyncio.gather, but if one awaitable fails, all others are
+    cancelled and awaited before the error is raised."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def close_all():
+    """terminate sessions of all pools of running event loop"""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _pools if key[0] == loop_id]:
+        await _pools.pop(key).close()
+
+
+async def nsdchat_command(nsdchat, *args, timeout=TIMEOUT) -> str:
+    """Run single nsdchat command, raises asyncio.TimeoutError if it is not
+    answered within timeout seconds once a session is free."""
+    return await get_pool(nsdchat).run(args, timeout)
+
+
+async def check_p5_connection(nsdchat, timeout=TIMEOUT) -> str:
+    """Check if connection to p5 server can be established.
+    Returns empty string on success, error message on failure."""
+    try:
+        hostname = await nsdchat_command(
+            nsdchat, "srvinfo", "hostname", timeout=timeout
+        )
+        if hostname.strip():
+            return ""
+        error = await get_error(nsdchat, timeout)
+        return error.strip() or "No reply from P5 server."
+    except Exception as error:
+        return str(error) or type(error).__name__
+
+
+async def new_restore_selection(nsdchat, timeout=TIMEOUT) -> str:
+    """Creates a new restore selection.
+    Returns restore ID on success, empty string on failure."""
+    return await nsdchat_command(
+        nsdchat,
+        "RestoreSelection",
+        "create",
+        "localhost",
+        "/Volumes/RESTORE/Archiware/",
+        timeout=timeout,
+    )
+
+
+async def find_entry(
+    nsdchat, restore_selection, archive_id, item, timeout=TIMEOUT
+) -> str:
+    """Searches for supplied item and adds it to restore selection.
+    Returns number of found entries on success, empty string on failure."""
+    return await nsdchat_command(
+        nsdchat,
+        "RestoreSelection",
+        restore_selection,
+        "findentry",
+        archive_id,
+        f"{{{pyp5.NAME_TERM.format(item)}}}",
+        timeout=timeout,
+    )
+
+
+async def find_entries(
+    nsdchat,
+    restore_selection,
+    archive_id,
+    items,
+    batch_size=pyp5.BATCH_SIZE,
+    term=pyp5.NAME_TERM,
+    timeout=TIMEOUT,
+) -> dict:
+    """Like pyp5.find_entries, all batches are searched concurrently
+    (bounded by the pool limit)."""
+    results = {}
+    items = list(dict.fromkeys(items))
+    batch_size = max(1, batch_size)
+    await gather(
+        *(
+            _find_batch(
+                nsdchat,
+                restore_selection,
+                archive_id,
+                items[start:start + batch_size],
+                results,
+                term,
+                timeout,
+            )
+            for start in range(0, len(items), batch_size)
+        )
+    )
+    return {item: results[item] for item in items}
+
+
+async def _find_batch(
+    nsdchat, restore_selection, archive_id, batch, results, term, timeout
+):
+    """Resolve single batch of items like pyp5._find_batch, the parts of a
+    split batch are searched concurrently."""
+    found = (
+        await nsdchat_command(
+            nsdchat,
+            "RestoreSelection",
+            restore_selection,
+            "findentry",
+            archive_id,
+            pyp5.batch_filter(batch, term),
+            timeout=timeout,
+        )
+    ).strip("\n")
+
+    resolved = pyp5.resolve_batch(batch, found)
+    if resolved is not None:
+        results.update(resolved)
+        return
+    await gather(
+        *(
+            _find_batch(
+                nsdchat, restore_selection, archive_id, part, results, term, timeout
+            )
+            for part in pyp5.split_batch(batch, found)
+        )
+    )
+
+
+async def get_entries(nsdchat, restore_selection, timeout=TIMEOUT) -> str:
+    """Returns number of entries in restore selection on success,
+    empty string on failure."""
+    return await nsdchat_command(
+        nsdchat, "RestoreSelection", restore_selection, "entries", timeout=timeout
+    )
+
+
+async def get_volumes(nsdchat, restore_selection, timeout=TIMEOUT) -> str:
+    """Returns needed volumes for restore on success,
+    empty string on failure."""
+    return await nsdchat_command(
+        nsdchat, "RestoreSelection", restore_selection, "volumes", timeout=timeout
+    )
+
+
+async def get_label(nsdchat, volume, timeout=TIMEOUT) -> str:
+    """Returns label of volume on success, empty string on failure."""
+    return await nsdchat_command(nsdchat, "Volume", volume, "label", timeout=timeout)
+
+
+async def get_barcode(nsdchat, volume, timeout=TIMEOUT) -> str:
+    """Returns barcode of volume on success, empty string on failure."""
+    return await nsdchat_command(nsdchat, "Volume", volume, "barcode", timeout=timeout)
+
+
+async def get_volume_info(
+    nsdchat, volumes, keys=pyp5.VOLUME_KEYS, timeout=TIMEOUT
+) -> dict:
+    """Returns dict of volume: {key: value} like pyp5.get_volume_info,
+    all values are fetched concurrently."""
+    volumes = list(dict.fromkeys(volumes))
+    replies = iter(
+        await gather(
+            *(
+                nsdchat_command(nsdchat, "Volume", volume, key, timeout=timeout)
+                for volume in volumes
+                for key in keys
+            )
+        )
+    )
+    return {
+        volume: {key: next(replies).strip("\n") for key in keys} for volume in volumes
+    }
+
+
+async def submit_restore(nsdchat, restore_selection, timeout=TIMEOUT) -> str:
+    """Submits restore selection for processing.
+    Returns job ID on success, empty string on failure."""
+    return (
+        await nsdchat_command(
+            nsdchat, "RestoreSelection", restore_selection, "submit", timeout=timeout
+        )
+    ).strip()
+
+
+async def describe(nsdchat, restore_selection, title, timeout=TIMEOUT) -> str:
+    """Set description for job monitor"""
+    return (
+        await nsdchat_command(
+            nsdchat,
+            "RestoreSelection",
+            restore_selection,
+            "describe",
+            title,
+            timeout=timeout,
+        )
+    ).strip()
+
+
+async def destroy(nsdchat, restore_selection, timeout=TIMEOUT) -> str:
+    """Destroy restore selection"""
+    return (
+        await nsdchat_command(
+            nsdchat, "RestoreSelection", restore_selection, "destroy", timeout=timeout
+        )
+    ).strip()
+
+
+async def get_error(nsdchat, timeout=TIMEOUT) -> str:
+    """Get last error from nsdchat application"""
+    return await nsdchat_command(nsdchat, "geterror", timeout=timeout)
+
+
+async def get_archive_index(nsdchat, timeout=TIMEOUT) -> str:
+    """Get all available archive plan indexes"""
+    return await nsdchat_command(nsdchat, "ArchivPlan", "names", timeout=timeout)
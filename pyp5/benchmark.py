@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+pyp5 - benchmark
+Benchmark suite for the ALE, EDL and AAF parsers.
+
+Synthetic lists are generated from a fixed seed, so every run (and every
+commit) parses exactly the same clips. Generated files are kept in the
+work folder and reused. For each parser and size the suite measures
+throughput, peak memory (tracemalloc, separate run) and time until the
+first item is available, and writes the results as JSON:
+
+    python benchmark.py --sizes 100,10000,1000000 --parsers ale,edl
+    python benchmark.py --output new.json --compare old.json
+
+With --startup, import and start times of the modules (and of frozen
+binaries supplied with --binary, started with --help) are measured instead:
+
+    python benchmark.py --startup --binary ./pyp5_cli
+
+With --compare the exit code is 1 if a parser got slower or needs more
+memory than the threshold allows. Writing AAFs with pyaaf2 takes about
+2 ms per clip, large AAF sizes take a while to generate the first time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+import pyp5
+
+
+SEED = 5
+SIZES = (100, 1000, 10000)
+REPEAT = 3
+STARTUP_MODULES = ("pyp5", "pyp5_cli", "pyp5_gui")
+THRESHOLD = 0.25
+WORK_DIR = os.path.join(tempfile.gettempdir(), "pyp5_benchmark")
+FPS = 25
+
+
+def timecode(frames) -> str:
+    """frame count to HH:MM:SS:FF"""
+    seconds, frame = divmod(frames, FPS)
+    minutes, second = divmod(seconds, 60)
+    hours, minute = divmod(minutes, 60)
+    return f"{hours % 24:02d}:{minute:02d}:{second:02d}:{frame:02d}"
+
+
+def clip_names(clips, seed):
+    """Deterministic clip names, about every 20th name is repeated like
+    clips used more than once in a cut."""
+    rng = random.Random(seed)
+    names = []
+    for number in range(clips):
+        if names and rng.random() < 0.05:
+            names.append(rng.choice(names))
+        else:
+            names.append(
+                f"A{rng.randint(1, 999):03d}C{number:07d}_"
+                f"{rng.randint(100000, 999999)}_{rng.choice('ABCDEFGH')}{rng.randint(1, 9)}"
+            )
+    return names
+
+
+def make_ale(file, clips, seed=SEED):
+    """write synthetic ALE file with supplied number of clips"""
+    rng = random.Random(seed)
+    with open(file, "w", encoding="utf-8") as ale_file:
+        ale_file.write(
+            "Heading\nFIELD_DELIM\tTABS\nVIDEO_FORMAT\t1080\nAUDIO_FORMAT\t48khz\n"
+            f"FPS\t{FPS}\n\nColumn\n"
+            "Name\tTracks\tStart\tEnd\tTape\tSource File\tCamroll\n\nData\n"
+        )
+        for name in clip_names(clips, seed):
+            start = rng.randint(0, 2000000)
+            end = start + rng.randint(25, 20000)
+            ale_file.write(
+                f"{name}\tV\t{timecode(start)}\t{timecode(end)}\t{name[:4]}\t"
+                f"{name}.mxf\t{name[:4]}\n"
+            )
+
+
+def make_edl(file, clips, seed=SEED):
+    """write synthetic CMX3600 EDL, every 10th event is a dissolve"""
+    rng = random.Random(seed)
+    record = 3600 * FPS
+    with open(file, "w", encoding="utf-8") as edl_file:
+        edl_file.write("TITLE: BENCHMARK\nFCM: NON-DROP FRAME\n\n")
+        names = clip_names(clips, seed)
+        event = 0
+        index = 0
+        while index < len(names):
+            event += 1
+            duration = rng.randint(25, 500)
+            source = rng.randint(0, 2000000)
+            dissolve = event % 10 == 0 and index + 1 < len(names)
+            group = names[index:index + 2] if dissolve else names[index:index + 1]
+            for position, name in enumerate(group):
+                transition = "D    025" if position else "C       "
+                edl_file.write(
+                    f"{event % 1000000:06d}  {name[:8]:8} V     {transition} "
+                    f"{timecode(source)} {timecode(source + duration)} "
+                    f"{timecode(record)} {timecode(record + duration)}\n"
+                )
+            edl_file.write(f"* FROM CLIP NAME: {group[0]}\n")
+            if dissolve:
+                edl_file.write(f"* TO CLIP NAME: {group[1]}\n")
+            for name in group:
+                edl_file.write(f"* SOURCE FILE: {name}.mxf\n")
+            edl_file.write("\n")
+            record += duration
+            index += len(group)
+
+
+def make_aaf(file, clips, seed=SEED):
+    """write synthetic AAF with one source mob and locator per clip"""
+    import aaf2
+
+    rng = random.Random(seed)
+    with aaf2.open(file, "w") as aaf_file:
+        for name in clip_names(clips, seed):
+            mob = aaf_file.create.SourceMob()
+            mob_id = aaf2.mobid.MobID.new()
+            mob_id.material = uuid.UUID(int=rng.getrandbits(128))
+            mob.mob_id = mob_id
+            mob.name = name
+            locator = aaf_file.create.NetworkLocator()
+            locator["URLString"].value = f"file:///Volumes/MEDIA/{name[:4]}/{name}.mxf"
+            descriptor = aaf_file.create.ImportDescriptor()
+            descriptor["Locator"].append(locator)
+            mob.descriptor = descriptor
+            aaf_file.content.mobs.append(mob)
+
+
+def first_aaf_item(file):
+    """first source mob name, read the same way as pyp5.read_source_mobs"""
+    import aaf2
+
+    with aaf2.open(file, "r", extensions=False) as aaf_file:
+        for mob in aaf_file.content.mobs:
+            if isinstance(mob, aaf2.mobs.SourceMob):
+                return mob.name
+    return None
+
+
+# --- parser name: (extension, generator, full parse, first item)
+PARSERS = {
+    "ale": (".ale", make_ale, pyp5.parse_ale, lambda file: next(pyp5.iter_ale(file))),
+    "edl": (".edl", make_edl, pyp5.parse_edl, lambda file: next(pyp5.iter_edl(file))),
+    "aaf": (".aaf", make_aaf, pyp5.parse_aaf, first_aaf_item),
+}
+
+
+def generate(parser, clips, seed=SEED, work_dir=WORK_DIR) -> str:
+    """path of synthetic file, generated only if it does not exist yet"""
+    extension, make, _, _ = PARSERS[parser]
+    os.makedirs(work_dir, exist_ok=True)
+    file = os.path.join(work_dir, f"{parser}-{clips}-{seed}{extension}")
+    if not os.path.exists(file):
+        partial = f"{file}.partial"
+        make(partial, clips, seed)
+        os.replace(partial, file)
+    return file
+
+
+def measure(parser, file, clips, repeat=REPEAT) -> dict:
+    """time full parse (best of repeat), first item and peak memory"""
+    _, _, parse, first = PARSERS[parser]
+
+    seconds = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        items = parse(file)
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    if items[:1] == ["ERROR"]:
+        raise ValueError(f"{file}: {items[1]}")
+
+    start = time.perf_counter()
+    first(file)
+    first_item = time.perf_counter() - start
+
+    tracemalloc.start()
+    parse(file)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    size = os.path.getsize(file)
+    return {
+        "parser": parser,
+        "clips": clips,
+        "items": len(items),
+        "bytes": size,
+        "seconds": round(seconds, 6),
+        "clips_per_second": round(clips / seconds, 1) if seconds else None,
+        "mb_per_second": round(size / seconds / 1e6, 3) if seconds else None,
+        "first_item_seconds": round(first_item, 6),
+        "peak_memory_bytes": peak,
+    }
+
+
+def import_times(module) -> dict:
+    """Cumulative import time of module and its heaviest imports in
+    microseconds, from python -X importtime in a fresh interpreter."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    imports = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if fields[1].strip().isdigit():
+            imports[fields[2].strip()] = int(fields[1])
+    heaviest = sorted(
+        (name for name in imports if name != module),
+        key=lambda name: -imports[name],
+    )[:5]
+    return {
+        "import_us": imports.get(module),
+        "heaviest": {name: imports[name] for name in heaviest},
+        "error": process.stderr.strip().splitlines()[-1] if process.returncode else "",
+    }
+
+
+def start_time(command, repeat=REPEAT) -> float:
+    """best wall time of running command until it exits"""
+    seconds = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        subprocess.run(
+            command,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return seconds
+
+
+def run_startup(modules=STARTUP_MODULES, binaries=(), repeat=REPEAT) -> list:
+    """import/start times of modules and frozen binaries"""
+    results = []
+    for module in modules:
+        result = {
+            "startup": module,
+            "seconds": round(
+                start_time([sys.executable, "-c", f"import {module}"], repeat), 6
+            ),
+        }
+        result.update(import_times(module))
+        results.append(result)
+    for binary in binaries:
+        results.append(
+            {
+                "startup": binary,
+                "seconds": round(start_time([binary, "--help"], repeat), 6),
+            }
+        )
+    for result in results:
+        print(
+            f"{result['startup']}: {result['seconds']:.4f}s",
+            file=sys.stderr,
+        )
+    return results
+
+
+def git_commit() -> str:
+    """commit of working tree, empty string outside of git"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(parsers, sizes, seed=SEED, repeat=REPEAT, work_dir=WORK_DIR) -> dict:
+    """benchmark all parsers and sizes, returns results document"""
+    results = []
+    for parser in parsers:
+        for clips in sizes:
+            file = generate(parser, clips, seed, work_dir)
+            result = measure(parser, file, clips, repeat)
+            print(
+                f"{parser} {clips:>8} clips: {result['seconds']:.4f}s "
+                f"({result['clips_per_second']} clips/s), first item "
+                f"{result['first_item_seconds']:.4f}s, peak "
+                f"{result['peak_memory_bytes'] / 1e6:.1f} MB",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=THRESHOLD) -> list:
+    """Returns regressions of current against baseline results, throughput,
+    peak memory or start time worse by more than threshold (fraction)."""
+    regressions = []
+    started = {old["startup"]: old for old in baseline.get("startup", [])}
+    for new in current.get("startup", []):
+        old = started.get(new["startup"])
+        if old is not None and new["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append(
+                f"{new['startup']} start: "
+                f"{old['seconds']:.4f}s -> {new['seconds']:.4f}s"
+            )
+
+    previous = {(old["parser"], old["clips"]): old for old in baseline["results"]}
+    for new in current["results"]:
+        old = previous.get((new["parser"], new["clips"]))
+        if old is None:
+            continue
+        if new["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append(
+                f"{new['parser']} {new['clips']} clips: "
+                f"{old['seconds']:.4f}s -> {new['seconds']:.4f}s"
+            )
+        if new["peak_memory_bytes"] > old["peak_memory_bytes"] * (1 + threshold):
+            regressions.append(
+                f"{new['parser']} {new['clips']} clips: peak memory "
+                f"{old['peak_memory_bytes']} -> {new['peak_memory_bytes']} bytes"
+            )
+    return regressions
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pyp5 list parsers.")
+    parser.add_argument(
+        "-p",
+        "--parsers",
+        default=",".join(PARSERS),
+        help="comma separated parsers to run (ale,edl,aaf)",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in SIZES),
+        help="comma separated clip counts",
+    )
+    parser.add_argument("--seed", type=int, default=SEED, help="generator seed")
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=REPEAT, help="runs per measurement"
+    )
+    parser.add_argument("--work-dir", default=WORK_DIR, help="generated files")
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="measure import and start times instead of parsers",
+    )
+    parser.add_argument(
+        "--binary",
+        action="append",
+        default=[],
+        help="frozen binary to measure with --startup, repeat for more",
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to file")
+    parser.add_argument("-c", "--compare", help="baseline JSON results")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="allowed slowdown/memory growth against baseline",
+    )
+    args = parser.parse_args(argv)
+
+    parsers = [name.strip() for name in args.parsers.split(",") if name.strip()]
+    unknown = [name for name in parsers if name not in PARSERS]
+    if unknown:
+        parser.error(f"unknown parser: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    if args.startup:
+        document = run([], [], args.seed, args.repeat, args.work_dir)
+        document["startup"] = run_startup(
+            STARTUP_MODULES, args.binary, max(args.repeat, 5)
+        )
+    else:
+        document = run(parsers, sizes, args.seed, args.repeat, args.work_dir)
+    output = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            regressions = compare(document, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,150 @@
+"""
+pyp5 - cache
+Persistent TTL cache for volume metadata (label, barcode, pool).
+
+Labels, barcodes and pools of LTO volumes practically never change, so
+lookups are answered from an in-memory LRU backed by a small SQLite file
+and only go to the P5 server when the cached value is missing or expired.
+The mode of a volume (Appendable, Full, ...) changes and is never cached.
+"""
+
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+import pyp5
+
+
+CACHE_FILE = f"{os.path.expanduser('~')}/.pyp5cache"
+TTL = 7 * 24 * 60 * 60
+LRU_SIZE = 1024
+VOLATILE_KEYS = ("mode",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    volume TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stored REAL NOT NULL,
+    PRIMARY KEY (volume, key)
+);
+"""
+
+
+class VolumeCache:
+    """in-memory LRU in front of an on-disk store with TTL"""
+
+    def __init__(self, file=CACHE_FILE, ttl=TTL, size=LRU_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        """close on-disk store"""
+        self.db.close()
+
+    def stats(self) -> dict:
+        """hit/miss counters"""
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.lru)}
+
+    def remember(self, volume, key, value, stored):
+        """put value into LRU, drop least recently used entries"""
+        self.lru[(volume, key)] = (value, stored)
+        self.lru.move_to_end((volume, key))
+        while len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+
+    def lookup(self, volume, key) -> str:
+        """Returns cached value, None if missing or expired."""
+        with self.lock:
+            cached = self.lru.get((volume, key))
+            if cached is None:
+                cached = self.db.execute(
+                    "SELECT value, stored FROM volumes WHERE volume = ? AND key = ?",
+                    (volume, key),
+                ).fetchone()
+                if cached is not None:
+                    self.remember(volume, key, *cached)
+            else:
+                self.lru.move_to_end((volume, key))
+
+            if cached is None or time.time() - cached[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return cached[0]
+
+    def store(self, volume, key, value):
+        """write value to LRU and on-disk store"""
+        stored = time.time()
+        with self.lock:
+            self.remember(volume, key, value, stored)
+            self.db.execute(
+                "INSERT OR REPLACE INTO volumes (volume, key, value, stored) "
+                "VALUES (?, ?, ?, ?)",
+                (volume, key, value, stored),
+            )
+            self.db.commit()
+
+    def invalidate(self, volume=None):
+        """drop cached values of single volume or of all volumes"""
+        with self.lock:
+            if volume is None:
+                self.lru.clear()
+                self.db.execute("DELETE FROM volumes")
+            else:
+                for key in [key for key in self.lru if key[0] == volume]:
+                    del self.lru[key]
+                self.db.execute("DELETE FROM volumes WHERE volume = ?", (volume,))
+            self.db.commit()
+
+    def get(self, nsdchat, volume, key, fetch) -> str:
+        """return cached value or fetch it from P5 server.
+        Empty replies (failures) are not cached."""
+        value = self.lookup(volume, key)
+        if value is None:
+            value = fetch(nsdchat, volume).strip("\n")
+            if value:
+                self.store(volume, key, value)
+        return value
+
+    def get_label(self, nsdchat, volume) -> str:
+        """cached pyp5.get_label, without trailing newline"""
+        return self.get(nsdchat, volume, "label", pyp5.get_label)
+
+    def get_barcode(self, nsdchat, volume) -> str:
+        """cached pyp5.get_barcode, without trailing newline"""
+        return self.get(nsdchat, volume, "barcode", pyp5.get_barcode)
+
+    def get_info(self, nsdchat, volumes, keys=pyp5.VOLUME_KEYS) -> dict:
+        """Cached pyp5.get_volume_info, values missing from the cache are
+        fetched together in one round-trip. Empty replies are not cached."""
+        info = {}
+        missing = []
+        for volume in dict.fromkeys(volumes):
+            info[volume] = {}
+            for key in keys:
+                value = None if key in VOLATILE_KEYS else self.lookup(volume, key)
+                if value is None:
+                    missing.append(("Volume", volume, key))
+                else:
+                    info[volume][key] = value
+
+        for (_, volume, key), reply in zip(
+            missing, pyp5.nsdchat_commands(nsdchat, missing)
+        ):
+            value = reply.strip("\n")
+            info[volume][key] = value
+            if value and key not in VOLATILE_KEYS:
+                self.store(volume, key, value)
+        return {
+            volume: {key: values[key] for key in keys}
+            for volume, values in info.items()
+        }
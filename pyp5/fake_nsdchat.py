@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+pyp5 - fake nsdchat
+Stand-in for /usr/local/aw/bin/nsdchat to run pyp5 without a P5 server.
+
+Supports one-shot mode (-c command ...) and interactive mode (commands on
+stdin, one reply line per command, echo for the reply markers of
+session.py). Archive entries are read from a tab separated catalogue file
+(path, volume, optional mtime) set with FAKE_NSDCHAT_CATALOG, restore
+selections are kept in FAKE_NSDCHAT_STATE so all running fake processes
+share them. Without a catalogue file a synthetic catalogue of
+FAKE_NSDCHAT_SYNTHETIC entries is generated from FAKE_NSDCHAT_SEED.
+
+Slow or flaky servers are simulated per command verb (findentry, label,
+submit, ... or * for all others), values are comma separated verb=number:
+
+    FAKE_NSDCHAT_LATENCY=findentry=0.2,*=0.01   seconds per command
+    FAKE_NSDCHAT_JITTER=*=0.05                  random extra seconds
+    FAKE_NSDCHAT_FAILURES=submit=0.1            probability of failing
+    FAKE_NSDCHAT_STARTUP=0.5                    seconds to start process
+
+Every process writes its command counts to stats.<pid> in the state folder
+when it exits.
+
+Usage in .pyp5conf:
+    nsdchat = /path/to/pyp5/fake_nsdchat.py
+"""
+
+from collections import Counter
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+from session import quote
+
+
+CATALOG = os.environ.get("FAKE_NSDCHAT_CATALOG", "")
+STATE = os.environ.get(
+    "FAKE_NSDCHAT_STATE", os.path.join(tempfile.gettempdir(), "fake_nsdchat")
+)
+SYNTHETIC = int(os.environ.get("FAKE_NSDCHAT_SYNTHETIC", "0") or 0)
+SEED = int(os.environ.get("FAKE_NSDCHAT_SEED", "5") or 5)
+CLIPS_PER_VOLUME = 800
+# --- every nth clip is archived a second time, name searches match twice
+DUPLICATE_EVERY = 20
+
+FILTER_TERM = re.compile(r"(name|path)\s*(\*=|==)\s*'([^']*)'")
+FILTER_MTIME = re.compile(r"mtime\s*>\s*(\d+)")
+
+
+def split_command(line) -> list:
+    """split command line into words, braces group words like in tcl"""
+    words = []
+    word = ""
+    depth = 0
+    for char in line.strip():
+        if char == "{":
+            if depth:
+                word += char
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth:
+                word += char
+            else:
+                words.append(word)
+                word = ""
+        elif char.isspace() and not depth:
+            if word:
+                words.append(word)
+                word = ""
+        else:
+            word += char
+    if word:
+        words.append(word)
+    return words
+
+
+def parse_rates(spec) -> dict:
+    """parse 'verb=number,*=number' into dict of verb: float"""
+    rates = {}
+    for part in spec.split(","):
+        verb, _, value = part.partition("=")
+        if verb.strip() and value.strip():
+            rates[verb.strip()] = float(value)
+    return rates
+
+
+def command_verb(words) -> str:
+    """verb of command used for latency settings and statistics"""
+    if len(words) >= 2 and words[0] == "RestoreSelection" and words[1] == "create":
+        return "create"
+    if len(words) >= 3 and words[0] in ("RestoreSelection", "Volume", "ArchiveIndex"):
+        return words[2]
+    return words[0] if words else ""
+
+
+def synthetic_catalog(entries, seed=SEED) -> list:
+    """Deterministic catalogue of camera clips, (path, volume, mtime).
+    Clips recorded together are archived to the same volume, every
+    DUPLICATE_EVERY-th clip is archived again to a backup volume later."""
+    rng = random.Random(seed)
+    catalog = []
+    for number in range(entries):
+        camera = rng.randint(1, 999)
+        name = f"A{camera:03d}C{number:07d}_{rng.randint(100000, 999999)}.mxf"
+        project = f"PRJ{number // (CLIPS_PER_VOLUME * 10):04d}"
+        volume = 10001 + number // CLIPS_PER_VOLUME + (rng.random() < 0.02)
+        mtime = 1600000000 + number * 60
+        catalog.append((f"/Volumes/PROJECTS/{project}/{name}", str(volume), mtime))
+
+    backup = str(10002 + entries // CLIPS_PER_VOLUME)
+    for path, _, mtime in catalog[DUPLICATE_EVERY - 1::DUPLICATE_EVERY]:
+        name = os.path.basename(path)
+        catalog.append((f"/Volumes/BACKUP/{name}", backup, mtime + entries * 60))
+    return catalog
+
+
+class FakeServer:
+    """minimal emulation of the nsdchat commands used by pyp5"""
+
+    def __init__(
+        self,
+        catalog=CATALOG,
+        state=STATE,
+        synthetic=SYNTHETIC,
+        seed=SEED,
+        latency="",
+        jitter="",
+        failures="",
+    ):
+        self.state = state
+        os.makedirs(self.state, exist_ok=True)
+        self.entries = []
+        if catalog:
+            with open(catalog, "r", encoding="utf-8") as catalog_file:
+                for line in catalog_file:
+                    fields = line.rstrip("\n").split("\t")
+                    mtime = int(fields[2]) if len(fields) > 2 else 0
+                    self.entries.append((fields[0], fields[1], mtime))
+        elif synthetic:
+            self.entries = synthetic_catalog(synthetic, seed)
+        self.names = [os.path.basename(entry[0]) for entry in self.entries]
+        self.latency = parse_rates(latency)
+        self.jitter = parse_rates(jitter)
+        self.failures = parse_rates(failures)
+        self.random = random.Random()
+        self.calls = Counter()
+        self.failed = Counter()
+
+    @staticmethod
+    def rate(rates, verb) -> float:
+        """setting for verb, falls back to * and 0"""
+        return rates.get(verb, rates.get("*", 0.0))
+
+    def simulate(self, words) -> bool:
+        """Sleep configured latency plus jitter for command.
+        Returns True if the command should fail."""
+        verb = command_verb(words)
+        self.calls[verb] += 1
+        delay = self.rate(self.latency, verb)
+        jitter = self.rate(self.jitter, verb)
+        if jitter:
+            delay += self.random.uniform(0, jitter)
+        if delay:
+            time.sleep(delay)
+        if self.random.random() < self.rate(self.failures, verb):
+            self.failed[verb] += 1
+            return True
+        return False
+
+    def execute(self, words) -> str:
+        """run command with simulated latency and failures"""
+        if self.simulate(words):
+            return self.set_error(f"simulated failure: {command_verb(words)}")
+        return self.run(words)
+
+    def save_stats(self):
+        """write command counts of this process to state folder"""
+        stats = os.path.join(self.state, f"stats.{os.getpid()}")
+        with open(stats, "w", encoding="utf-8") as stats_file:
+            json.dump({"calls": self.calls, "failed": self.failed}, stats_file)
+
+    def selection_file(self, selection, suffix) -> str:
+        """path of state file belonging to restore selection"""
+        return os.path.join(self.state, f"{selection}.{suffix}")
+
+    def set_error(self, message) -> str:
+        """remember error for geterror, returns empty reply"""
+        with open(os.path.join(self.state, "error"), "w", encoding="utf-8") as error:
+            error.write(message)
+        return ""
+
+    def selection_paths(self, selection) -> list:
+        """paths added to restore selection so far"""
+        file = self.selection_file(selection, "entries")
+        with open(file, "r", encoding="utf-8") as entries:
+            return list(dict.fromkeys(line.rstrip("\n") for line in entries))
+
+    def find(self, key, operator, term) -> list:
+        """all catalogue entries matching single filter term, oldest first"""
+        matches = []
+        for entry, name in zip(self.entries, self.names):
+            value = name if key == "name" else entry[0]
+            if (term in value) if operator == "*=" else (term == value):
+                matches.append(entry)
+        return sorted(matches, key=lambda entry: entry[2])
+
+    def run(self, words) -> str:
+        """execute single command, returns reply without newline"""
+        if words[:2] == ["srvinfo", "hostname"]:
+            return "fake-p5"
+        if words == ["geterror"]:
+            try:
+                file = os.path.join(self.state, "error")
+                with open(file, "r", encoding="utf-8") as error:
+                    return error.read()
+            except IOError:
+                return ""
+        if words[:2] == ["ArchivPlan", "names"]:
+            return "10001"
+        if len(words) == 3 and words[0] == "Volume":
+            if words[2] == "label":
+                return f"LABEL-{words[1]}"
+            if words[2] == "barcode":
+                if not words[1].isdigit():
+                    return words[1]
+                return f"{int(words[1]) % 1000000:06d}L6"
+            if words[2] == "pool":
+                return "Default-Archive"
+            if words[2] == "mode":
+                full = words[1].isdigit() and int(words[1]) % 3
+                return "Full" if full else "Appendable"
+        if len(words) >= 4 and words[0] == "ArchiveIndex" and words[2] == "inventory":
+            return self.inventory(words[1], words[3:])
+        if len(words) >= 2 and words[0] == "RestoreSelection":
+            return self.restore_selection(words[1], words[2:])
+        return self.set_error(f"unknown command: {' '.join(words)}")
+
+    def inventory(self, archive_id, args) -> str:
+        """write catalogue entries to inventory file, returns its path"""
+        since = FILTER_MTIME.search(args[1]) if len(args) > 1 else None
+        since = int(since.group(1)) if since else 0
+        inventory = os.path.join(self.state, f"inventory.{archive_id}.{os.getpid()}")
+        with open(inventory, "w", encoding="utf-8") as inventory_file:
+            for path, volume, mtime in self.entries:
+                if mtime > since:
+                    inventory_file.write(f"{path}\t{volume}\t{mtime}\n")
+        return inventory
+
+    def restore_selection(self, selection, args) -> str:
+        """RestoreSelection subcommands"""
+        if selection == "create":
+            selection = f"RestoreSelection.{uuid.uuid4().hex[:8]}"
+            file = self.selection_file(selection, "entries")
+            open(file, "a", encoding="utf-8").close()
+            return selection
+
+        if not os.path.exists(self.selection_file(selection, "entries")):
+            return self.set_error(f"no such restore selection: {selection}")
+
+        if args[:1] == ["findentry"] and len(args) == 3:
+            # --- counts every match, only the newest entry per term is added
+            count = 0
+            added = []
+            for key, operator, term in FILTER_TERM.findall(args[2]):
+                matches = self.find(key, operator, term)
+                count += len(matches)
+                added += matches[-1:]
+            file = self.selection_file(selection, "entries")
+            with open(file, "a", encoding="utf-8") as entries:
+                entries.write("".join(f"{entry[0]}\n" for entry in added))
+            return str(count)
+        if args == ["entries"]:
+            return str(len(self.selection_paths(selection)))
+        if args == ["volumes"]:
+            paths = set(self.selection_paths(selection))
+            volumes = {entry[1] for entry in self.entries if entry[0] in paths}
+            return " ".join(sorted(volumes))
+        if args[:1] == ["describe"] and len(args) == 2:
+            return args[1]
+        if args == ["submit"]:
+            if not self.selection_paths(selection):
+                return self.set_error(f"{selection} is empty")
+            return str(int(selection.split(".")[-1], 16) % 100000)
+        if args == ["destroy"]:
+            os.remove(self.selection_file(selection, "entries"))
+            return "1"
+        return self.set_error(f"unknown subcommand: {' '.join(args)}")
+
+
+def main(argv) -> int:
+    """one-shot mode with -c, interactive mode otherwise"""
+    # --- connection options (-s awsock:/...) are accepted and ignored
+    if "-s" in argv:
+        index = argv.index("-s")
+        argv = argv[:index] + argv[index + 2:]
+
+    server = FakeServer(
+        latency=os.environ.get("FAKE_NSDCHAT_LATENCY", ""),
+        jitter=os.environ.get("FAKE_NSDCHAT_JITTER", ""),
+        failures=os.environ.get("FAKE_NSDCHAT_FAILURES", ""),
+    )
+    time.sleep(float(os.environ.get("FAKE_NSDCHAT_STARTUP", "0") or 0))
+
+    try:
+        if argv[:1] == ["-c"]:
+            command = " ".join(quote(arg) for arg in argv[1:])
+            print(server.execute(split_command(command)))
+            return 0
+
+        for line in sys.stdin:
+            words = split_command(line)
+            if words == ["exit"]:
+                break
+            # --- reply markers of session.py, not counted as commands
+            if words[:1] == ["echo"]:
+                print(" ".join(words[1:]), flush=True)
+                continue
+            print(server.execute(words) if words else "", flush=True)
+        return 0
+    finally:
+        server.save_stats()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
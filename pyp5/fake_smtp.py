@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+pyp5 - fake smtp
+Stand-in SMTP server to try mail notifications without a mail server.
+
+Accepts every sender, receiver and login (no STARTTLS) and writes each
+received message to a numbered .eml file in FAKE_SMTP_SPOOL.
+
+Usage in .pyp5conf:
+    [NOTIFICATION]
+    smtp = localhost
+    port = 8025
+    starttls = no
+"""
+
+import itertools
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+
+
+SPOOL = os.environ.get(
+    "FAKE_SMTP_SPOOL", os.path.join(tempfile.gettempdir(), "fake_smtp")
+)
+PORT = 8025
+
+_counter = itertools.count(1)
+_counter_lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """single SMTP session"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self.reply("250-fake-smtp")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.store(self.read_data())
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self) -> bytes:
+        """read message until single dot line"""
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line.rstrip(b"\r\n") == b".":
+                return b"".join(lines)
+            if line.startswith(b".."):
+                line = line[1:]
+            lines.append(line)
+
+    @staticmethod
+    def store(message):
+        """write message to spool folder"""
+        with _counter_lock:
+            number = next(_counter)
+        file = os.path.join(SPOOL, f"{os.getpid()}-{number:06d}.eml")
+        with open(file, "wb") as eml:
+            eml.write(message)
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """threaded server, usable in a background thread for testing"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main(argv) -> int:
+    port = int(argv[1]) if len(argv) > 1 else PORT
+    os.makedirs(SPOOL, exist_ok=True)
+    with FakeSMTPServer(("localhost", port), SMTPHandler) as server:
+        print(f"fake smtp listening on localhost:{port}, spool {SPOOL}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
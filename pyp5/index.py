@@ -0,0 +1,203 @@
+"""
+pyp5 - index
+Local SQLite snapshot of a P5 archive index for offline lookups.
+
+Entry names are kept in a trigram FTS table, so the substring searches
+done by find_entry ('name *= item') run locally. Hits are sent to the P5
+server by exact path, items not in the snapshot are still searched on the
+server by name, a stale snapshot never hides archived clips.
+
+Refreshes only fetch entries with a file mtime newer than the newest one
+seen so far. Media archived later with an older mtime (camera originals
+keep their shoot date) and deleted entries are only picked up by a full
+rebuild, done once the last one is older than REBUILD. An index file
+holds the entries of a single archive index.
+
+The inventory file listed by 'ArchiveIndex inventory' is written by the P5
+server, refresh reads it from the local file system. The index is only
+usable where that file can be read, i.e. when pyp5 runs on the P5 server
+or the server's inventory folder is mounted at the same path.
+"""
+
+import os
+import sqlite3
+import time
+import pyp5
+
+
+# --- seconds after which a long running process refreshes the snapshot
+TTL = 300
+# --- seconds after which a refresh rebuilds the snapshot from scratch
+REBUILD = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    volume TEXT NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+SCHEMA_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+    name, content='entries', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+
+class ArchiveIndex:
+    """snapshot of archive entry names, paths and volumes"""
+
+    def __init__(self, file):
+        self.file = file
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # --- trigram tokenizer needs SQLite 3.34, fall back to LIKE scans
+        try:
+            self.db.executescript(SCHEMA_FTS)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.db.commit()
+        self.refreshed = 0.0
+
+    def close(self):
+        """close database"""
+        self.db.close()
+
+    def get_meta(self, key, default="") -> str:
+        """read value from meta table"""
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """write value to meta table"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def refresh(self, nsdchat, archive_id, rebuild=REBUILD) -> int:
+        """Fetch entries modified since last refresh from P5 server, all
+        entries if the last full rebuild is older than rebuild seconds.
+        Returns number of new or changed entries."""
+        full = time.time() - float(self.get_meta(f"rebuilt:{archive_id}", "0")) > rebuild
+        since = 0 if full else int(self.get_meta(f"mtime:{archive_id}", "0"))
+        inventory = pyp5.get_inventory(nsdchat, archive_id, since).strip("\n")
+        if not inventory:
+            raise IOError(pyp5.get_error(nsdchat).strip() or "Inventory failed.")
+        if not os.path.isfile(inventory):
+            raise IOError(
+                f"Inventory file {inventory} was written on the P5 server and "
+                "is not readable here, run pyp5 on the P5 server to use an index."
+            )
+
+        count = 0
+        newest = since
+        if full:
+            # --- same transaction as the inserts, lookups never see it empty
+            self.db.execute("DELETE FROM entries")
+        with open(inventory, "r", encoding="utf-8") as inventory_file:
+            rows = (line.rstrip("\n").split("\t") for line in inventory_file)
+            for path, volume, mtime in (row[:3] for row in rows if len(row) >= 3):
+                self.db.execute(
+                    "INSERT INTO entries (path, name, volume, mtime) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                    "volume = excluded.volume, mtime = excluded.mtime",
+                    (path, os.path.basename(path), volume, int(mtime)),
+                )
+                newest = max(newest, int(mtime))
+                count += 1
+
+        self.set_meta(f"mtime:{archive_id}", newest)
+        if full:
+            self.set_meta(f"rebuilt:{archive_id}", time.time())
+        self.db.commit()
+        self.refreshed = time.time()
+        return count
+
+    def stale(self, ttl=TTL) -> bool:
+        """snapshot was not refreshed within ttl seconds"""
+        return time.time() - self.refreshed > ttl
+
+    def lookup(self, item) -> list:
+        """Returns (path, volume) of all entries whose name contains item,
+        newest first."""
+        if self.fts and len(item) >= 3:
+            rows = self.db.execute(
+                "SELECT entries.path, entries.volume FROM names "
+                "JOIN entries ON entries.id = names.rowid "
+                "WHERE names MATCH ? AND instr(entries.name, ?) "
+                "ORDER BY entries.mtime DESC",
+                ('"' + item.replace('"', '""') + '"', item),
+            )
+        else:
+            rows = self.db.execute(
+                "SELECT path, volume FROM entries WHERE instr(name, ?) "
+                "ORDER BY mtime DESC",
+                (item,),
+            )
+        return rows.fetchall()
+
+    def resolve(self, items) -> dict:
+        """Returns dict of item: path of newest matching entry,
+        empty string for items not in index."""
+        resolved = {}
+        for item in dict.fromkeys(items):
+            matches = self.lookup(item)
+            resolved[item] = matches[0][0] if matches else ""
+        return resolved
+
+    def find_entries(
+        self,
+        nsdchat,
+        restore_selection,
+        archive_id,
+        items,
+        batch_size=pyp5.BATCH_SIZE,
+        jobs=1,
+    ) -> dict:
+        """Like pyp5.find_entries, but items are resolved against the index
+        first and hits are added to restore selection by exact path. Items
+        not in the index or not found by path are searched on the server."""
+        resolved = self.resolve(items)
+        found = pyp5.find_paths(
+            nsdchat,
+            restore_selection,
+            archive_id,
+            [path for path in resolved.values() if path],
+            batch_size,
+            jobs,
+        )
+        results = {
+            item: found.get(path, "0") if path else "0"
+            for item, path in resolved.items()
+        }
+
+        missing = [
+            item
+            for item, count in results.items()
+            if not (count.isdigit() and int(count) > 0)
+        ]
+        if missing:
+            results.update(
+                pyp5.find_entries(
+                    nsdchat, restore_selection, archive_id, missing, batch_size, jobs
+                )
+            )
+        return results
@@ -2,22 +2,43 @@
 
 # Shell script to create standalone macOS executable.
 # Very specific, may need to be modified for general use.
+#
+# onefile (default) builds a single executable that unpacks itself on every
+# start. onedir builds a folder with the executable and its libraries, which
+# starts much faster when launched repeatedly (e.g. from cron).
 
 if [ $# -lt 2 ]
 then
     echo "installer: Missing arguments"
-    echo "usage: "$0" [python_script] [target_architecture (x86_64, arm64, universal2)]"
+    echo "usage: "$0" [python_script] [target_architecture (x86_64, arm64, universal2)] [onefile|onedir]"
     exit 1
 fi
 
-pyinstaller --onefile --clean --target-architecture "$2" "$1"
+name="$(basename "$1" .py)"
+mode="${3:-onefile}"
+
+if [ "$mode" != "onefile" ] && [ "$mode" != "onedir" ]
+then
+    echo "installer: Unknown build mode "$mode" (onefile, onedir)"
+    exit 1
+fi
+
+# --- the CLI never needs tkinter, leave it out to keep the bundle small
+excludes=()
+if [ "$name" = "pyp5_cli" ]
+then
+    excludes=(--exclude-module tkinter)
+fi
+
+pyinstaller --"$mode" --clean --target-architecture "$2" "${excludes[@]}" "$1"
 
 if [ $? -eq 1 ]; then
     echo "Compilation failed."
 else
-    mv dist/"$(basename "$1" .py)" .
+    rm -rf "./$name"
+    mv dist/"$name" .
     rm -rf __pycache__
     rm -rf build
     rm -rf dist
-    rm "$(basename "$1" .py)".spec
+    rm "$name".spec
 fi
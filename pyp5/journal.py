@@ -0,0 +1,126 @@
+"""
+pyp5 - journal
+Crash-safe, append-only journal of a restore job.
+
+Every step of a job (restore selection created, items searched, volumes
+resolved, submit started/finished) is appended as one JSON line and synced
+to disk before the run continues. After a crash the journal is replayed and
+the job resumes from the last durable step. A line cut off by a crash is
+ignored. A journal only applies to the exact input files it was written
+for, a changed file starts over.
+"""
+
+import json
+import os
+import threading
+
+
+CHUNK = 500
+
+
+def file_signature(files, archive_id) -> list:
+    """size and mtime of input files, a journal is only resumed for these"""
+    result = [str(archive_id)]
+    for file in sorted(files):
+        stat = os.stat(file)
+        result.append([os.path.basename(file), stat.st_size, stat.st_mtime_ns])
+    return result
+
+
+class State:
+    """job state replayed from journal"""
+
+    def __init__(self):
+        self.signature = None
+        self.restore_selection = ""
+        self.results = {}
+        self.volumes = []
+        self.submitting = False
+        self.job_id = ""
+
+    def found(self, item) -> bool:
+        """Item was found by an earlier run. Items not found ("0") or whose
+        search failed are searched again, their footage may be archived by
+        now."""
+        count = self.results.get(item, "")
+        return count.isdigit() and int(count) > 0
+
+    def apply(self, record):
+        """apply single journal record"""
+        step = record.get("step")
+        if step == "start":
+            self.signature = record["signature"]
+        elif step == "selection":
+            self.restore_selection = record["id"]
+            self.results = {}
+            self.volumes = []
+        elif step == "found":
+            self.results.update(record["results"])
+        elif step == "volumes":
+            self.volumes = record["volumes"]
+        elif step == "submitting":
+            self.submitting = True
+        elif step == "submit_failed":
+            self.submitting = False
+        elif step == "submitted":
+            self.job_id = record["job_id"]
+
+
+class Journal:
+    """append-only journal file of one job"""
+
+    def __init__(self, file, signature=None):
+        self.file = file
+        self.lock = threading.Lock()
+        self.state = State()
+        self.stale = State()
+        for record in self.read():
+            self.state.apply(record)
+
+        # --- journal of other input files, only its selection is of interest
+        signature = json.loads(json.dumps(signature))
+        if signature is not None and self.state.signature != signature:
+            self.stale, self.state = self.state, State()
+            self.state.signature = signature
+            os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+            partial = f"{file}.partial"
+            with open(partial, "w", encoding="utf-8") as journal_file:
+                journal_file.write(
+                    json.dumps({"step": "start", "signature": signature}) + "\n"
+                )
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(partial, file)
+
+    def read(self) -> list:
+        """all complete records of journal file"""
+        records = []
+        try:
+            with open(self.file, "r", encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    if not line.endswith("\n"):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def append(self, step, **values):
+        """append record and sync it to disk before returning"""
+        record = dict(values, step=step)
+        with self.lock:
+            with open(self.file, "a", encoding="utf-8") as journal_file:
+                journal_file.write(json.dumps(record) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self.state.apply(record)
+
+    def remove(self):
+        """delete journal once its job is done"""
+        try:
+            os.remove(self.file)
+        except FileNotFoundError:
+            pass
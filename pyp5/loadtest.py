@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+pyp5 - loadtest
+End-to-end throughput harness for pyp5_cli.main against fake_nsdchat.
+
+Every scenario runs the CLI in a fresh process with its own working
+folder, home folder (.pyp5conf, volume cache) and fake server state. All
+scenarios get the same restore lists, built from the synthetic catalogue
+of fake_nsdchat, so only the CLI options differ:
+
+    python loadtest.py --files 4 --items 500 --latency "*=0.005"
+    python loadtest.py --scenario "-b 50" --scenario "-j 8" -o result.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import fake_nsdchat
+
+
+SCENARIOS = ("", "-b 50", "-j 4", "--merge")
+FILES = 4
+ITEMS = 200
+MISSING = 0.1
+ENTRIES = 100000
+TIMEOUT = 3600
+
+CONF = """[GENERAL]
+nsdchat = {nsdchat}
+awsock = -s awsock:/loadtest@localhost:9001
+
+[RESTORE]
+archive_id = 10001
+
+[NOTIFICATION]
+email = loadtest@localhost
+"""
+
+RUNNER = (
+    "import sys; sys.path.insert(0, sys.argv[1]); import pyp5_cli; "
+    "sys.exit(pyp5_cli.main(sys.argv[2], sys.argv[3:]))"
+)
+
+
+def restore_lists(files, items, missing, entries, seed) -> list:
+    """Source file names for every restore list, missing fraction of them
+    is not in the catalogue."""
+    rng = random.Random(seed)
+    catalog = fake_nsdchat.synthetic_catalog(entries, seed)
+    names = list(dict.fromkeys(os.path.basename(entry[0]) for entry in catalog))
+    lists = []
+    for number in range(files):
+        clips = rng.sample(names, min(items, len(names)))
+        for index in range(len(clips)):
+            if rng.random() < missing:
+                clips[index] = f"MISSING{number:03d}_{index:06d}.mxf"
+        lists.append(clips)
+    return lists
+
+
+def write_ale(file, clips):
+    """write minimal ALE with Source File column"""
+    with open(file, "w", encoding="utf-8") as ale_file:
+        ale_file.write(
+            "Heading\nFIELD_DELIM\tTABS\n\nColumn\nName\tSource File\n\nData\n"
+        )
+        for clip in clips:
+            ale_file.write(f"{os.path.splitext(clip)[0]}\t{clip}\n")
+
+
+def read_stats(state) -> dict:
+    """sum command counts written by all fake nsdchat processes"""
+    calls = {}
+    failed = {}
+    for stats in glob.glob(os.path.join(state, "stats.*")):
+        with open(stats, "r", encoding="utf-8") as stats_file:
+            counts = json.load(stats_file)
+        for verb, count in counts["calls"].items():
+            calls[verb] = calls.get(verb, 0) + count
+        for verb, count in counts["failed"].items():
+            failed[verb] = failed.get(verb, 0) + count
+    processes = len(glob.glob(os.path.join(state, "stats.*")))
+    return {"calls": calls, "failed": failed, "processes": processes}
+
+
+def run_scenario(options, lists, args, work_dir) -> dict:
+    """run CLI once with supplied options, returns measurements"""
+    home = os.path.join(work_dir, "home")
+    state = os.path.join(work_dir, "state")
+    for folder in ("restore", "logs", "home", "state"):
+        os.makedirs(os.path.join(work_dir, folder))
+    with open(os.path.join(home, ".pyp5conf"), "w", encoding="utf-8") as conf:
+        conf.write(CONF.format(nsdchat=os.path.abspath(fake_nsdchat.__file__)))
+    for number, clips in enumerate(lists):
+        write_ale(os.path.join(work_dir, "restore", f"list{number:03d}.ale"), clips)
+
+    env = dict(
+        os.environ,
+        HOME=home,
+        FAKE_NSDCHAT_STATE=state,
+        FAKE_NSDCHAT_CATALOG="",
+        FAKE_NSDCHAT_SYNTHETIC=str(args.entries),
+        FAKE_NSDCHAT_SEED=str(args.seed),
+        FAKE_NSDCHAT_LATENCY=args.latency,
+        FAKE_NSDCHAT_JITTER=args.jitter,
+        FAKE_NSDCHAT_FAILURES=args.failures,
+        FAKE_NSDCHAT_STARTUP=str(args.startup),
+    )
+    command = [
+        sys.executable,
+        "-c",
+        RUNNER,
+        os.path.dirname(os.path.abspath(__file__)),
+        work_dir,
+    ] + shlex.split(options)
+
+    start = time.perf_counter()
+    process = subprocess.run(
+        command,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        timeout=args.timeout,
+        check=False,
+    )
+    seconds = time.perf_counter() - start
+
+    items = sum(len(clips) for clips in lists)
+    return {
+        "options": options,
+        "exit_code": process.returncode,
+        "seconds": round(seconds, 3),
+        "items": items,
+        "items_per_second": round(items / seconds, 1) if seconds else None,
+        "finished": len(glob.glob(os.path.join(work_dir, "finished", "*"))),
+        "failed": len(glob.glob(os.path.join(work_dir, "failed", "*"))),
+        "nsdchat": read_stats(state),
+        "output": process.stdout[-2000:],
+    }
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run pyp5_cli against fake_nsdchat and measure throughput."
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="CLI options of one scenario, repeat for more (default: "
+        + ", ".join(f'"{scenario}"' for scenario in SCENARIOS)
+        + ")",
+    )
+    parser.add_argument("--files", type=int, default=FILES, help="restore lists")
+    parser.add_argument("--items", type=int, default=ITEMS, help="items per list")
+    parser.add_argument(
+        "--missing", type=float, default=MISSING, help="fraction of missing items"
+    )
+    parser.add_argument(
+        "--entries", type=int, default=ENTRIES, help="synthetic catalogue size"
+    )
+    parser.add_argument("--seed", type=int, default=fake_nsdchat.SEED)
+    parser.add_argument("--latency", default="", help="e.g. findentry=0.1,*=0.01")
+    parser.add_argument("--jitter", default="", help="e.g. *=0.02")
+    parser.add_argument("--failures", default="", help="e.g. submit=0.05")
+    parser.add_argument(
+        "--startup", type=float, default=0.0, help="nsdchat start delay in seconds"
+    )
+    parser.add_argument("--timeout", type=int, default=TIMEOUT)
+    parser.add_argument("--keep", action="store_true", help="keep working folders")
+    parser.add_argument("-o", "--output", help="write JSON results to file")
+    args = parser.parse_args(argv)
+
+    lists = restore_lists(args.files, args.items, args.missing, args.entries, args.seed)
+    results = []
+    for options in args.scenario or SCENARIOS:
+        work_dir = tempfile.mkdtemp(prefix="pyp5_loadtest_")
+        try:
+            result = run_scenario(options, lists, args, work_dir)
+        finally:
+            if not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        print(
+            f'"{options}": {result["seconds"]:.2f}s, '
+            f'{result["items_per_second"]} items/s, '
+            f'{sum(result["nsdchat"]["calls"].values())} nsdchat commands, '
+            f'exit code {result["exit_code"]}',
+            file=sys.stderr,
+        )
+        results.append(result)
+
+    document = {
+        "files": args.files,
+        "items": args.items,
+        "missing": args.missing,
+        "entries": args.entries,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "failures": args.failures,
+        "startup": args.startup,
+        "results": results,
+    }
+    output = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return 0 if all(result["exit_code"] == 0 for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
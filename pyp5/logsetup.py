@@ -0,0 +1,162 @@
+"""
+pyp5 - logsetup
+Queue based logging with a single writer thread.
+
+Loggers only put records on a queue, a QueueListener thread formats them
+and writes them to the application log (rotated by size or time) or to the
+log file of the input file they belong to. Per-file sinks are reference
+counted and their file is closed as soon as the last user closed it:
+
+    app_logger = logsetup.start("logs/pyp5.log")
+    file_logger = logsetup.open_sink("FILE:list.ale", "logs/list.ale.log")
+    ...
+    logsetup.close_sink(file_logger)
+"""
+
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+import atexit
+import logging
+import queue
+import threading
+
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+FORMAT = "%(asctime)s %(levelname)-8s %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+APP = "APP"
+
+_queue = queue.Queue(-1)
+_listener = None
+_router = None
+_sinks = {}
+_lock = threading.Lock()
+
+
+class Router(logging.Handler):
+    """Runs in listener thread, hands records to the file handler of their
+    logger. Sinks are added and closed with control records (add_sink,
+    close_sink) travelling through the same queue, so all records logged
+    before a close are written first."""
+
+    def __init__(self):
+        super().__init__()
+        self.targets = {}
+
+    def handle(self, record):
+        sink = getattr(record, "add_sink", None)
+        if sink is not None:
+            previous = self.targets.get(record.name)
+            if previous is not None:
+                previous.close()
+            self.targets[record.name] = sink
+            return True
+
+        handler = self.targets.get(record.name)
+        if getattr(record, "close_sink", False):
+            if handler is not None and self.targets.pop(record.name) is handler:
+                handler.close()
+            return True
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+        return True
+
+    def close(self):
+        for handler in self.targets.values():
+            handler.close()
+        self.targets.clear()
+        super().close()
+
+
+def formatter() -> logging.Formatter:
+    """formatter shared by all log files"""
+    return logging.Formatter(FORMAT, DATE_FORMAT)
+
+
+def start(
+    app_file, level=logging.INFO, max_bytes=MAX_BYTES, backups=BACKUPS, when=None
+):
+    """Start writer thread, returns application logger. The application
+    log is rotated at midnight etc. if when is set, by size otherwise."""
+    global _listener, _router
+    with _lock:
+        if _listener is None:
+            _router = Router()
+            _listener = QueueListener(_queue, _router)
+            _listener.start()
+            atexit.register(stop)
+
+        if when:
+            handler = TimedRotatingFileHandler(
+                app_file, when=when, backupCount=backups, encoding="utf-8"
+            )
+        else:
+            handler = RotatingFileHandler(
+                app_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+        handler.setFormatter(formatter())
+        _queue.put_nowait(_control(APP, "add_sink", handler))
+        return _attach(APP, level)
+
+
+def _attach(name, level) -> logging.Logger:
+    """logger name with a single queue handler"""
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        logger.addHandler(QueueHandler(_queue))
+    return logger
+
+
+def open_sink(name, file, level=logging.INFO) -> logging.Logger:
+    """Logger writing to file, opened once however often it is requested.
+    Every open_sink needs a matching close_sink."""
+    with _lock:
+        if _listener is None:
+            raise RuntimeError("logsetup.start() not called")
+        users, _ = _sinks.get(name, (0, file))
+        if not users:
+            handler = logging.FileHandler(file, encoding="utf-8", delay=True)
+            handler.setFormatter(formatter())
+            # --- registered in listener thread, keeps order with pending closes
+            _queue.put_nowait(_control(name, "add_sink", handler))
+        _sinks[name] = (users + 1, file)
+        return _attach(name, level)
+
+
+def close_sink(logger):
+    """release per-file logger, its file is closed after the last release"""
+    name = logger.name
+    with _lock:
+        users, file = _sinks.get(name, (0, None))
+        if users > 1:
+            _sinks[name] = (users - 1, file)
+            return
+        _sinks.pop(name, None)
+        if _listener is not None:
+            _queue.put_nowait(_control(name, "close_sink", True))
+
+
+def _control(name, key, value) -> logging.LogRecord:
+    """record telling the router to add or close a sink"""
+    record = logging.LogRecord(name, logging.NOTSET, "", 0, "", None, None)
+    setattr(record, key, value)
+    return record
+
+
+def stop():
+    """write pending records and close all log files"""
+    global _listener, _router
+    with _lock:
+        listener, router = _listener, _router
+        _listener, _router = None, None
+        _sinks.clear()
+    if listener is not None:
+        listener.stop()
+        router.close()
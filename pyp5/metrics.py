@@ -0,0 +1,193 @@
+"""
+pyp5 - metrics
+Counters and latency histograms for nsdchat commands and parsers.
+
+Every measurement is keyed by kind (nsdchat, parser) and name (command
+verb like findentry or label, parser like ale) and counts calls, failures,
+bytes and seconds. Results can be written as JSON or as Prometheus
+textfile for the node_exporter textfile collector:
+
+    before = metrics.snapshot()
+    ...
+    logger.info(metrics.summary(metrics.diff(before)))
+    metrics.write_json("logs/metrics.json")
+    metrics.write_prometheus("logs/pyp5.prom")
+"""
+
+from contextlib import contextmanager
+import bisect
+import copy
+import json
+import os
+import threading
+import time
+
+
+# --- upper bounds of histogram buckets in seconds, last bucket is +Inf
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def new_stat() -> dict:
+    """empty measurement"""
+    return {
+        "count": 0,
+        "failures": 0,
+        "bytes": 0,
+        "seconds": 0.0,
+        "buckets": [0] * (len(BUCKETS) + 1),
+    }
+
+
+def record(kind, name, seconds, size=0, failed=False):
+    """add single measurement"""
+    with _lock:
+        stat = _stats.setdefault((kind, name), new_stat())
+        stat["count"] += 1
+        stat["failures"] += bool(failed)
+        stat["bytes"] += size
+        stat["seconds"] += seconds
+        stat["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+@contextmanager
+def timed(kind, name):
+    """Measure block, yields dict to set 'bytes' and 'failed' in.
+    Exceptions count as failures."""
+    result = {"bytes": 0, "failed": False}
+    start = time.perf_counter()
+    try:
+        yield result
+    except BaseException:
+        result["failed"] = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record(kind, name, seconds, result["bytes"], result["failed"])
+
+
+def snapshot() -> dict:
+    """copy of all measurements so far"""
+    with _lock:
+        return copy.deepcopy(_stats)
+
+
+def diff(before) -> dict:
+    """measurements recorded since supplied snapshot"""
+    result = {}
+    for key, stat in snapshot().items():
+        old = before.get(key, new_stat())
+        if stat["count"] == old["count"]:
+            continue
+        result[key] = {
+            "count": stat["count"] - old["count"],
+            "failures": stat["failures"] - old["failures"],
+            "bytes": stat["bytes"] - old["bytes"],
+            "seconds": stat["seconds"] - old["seconds"],
+            "buckets": [
+                new - prev for new, prev in zip(stat["buckets"], old["buckets"])
+            ],
+        }
+    return result
+
+
+def reset():
+    """drop all measurements"""
+    with _lock:
+        _stats.clear()
+
+
+def quantile(stat, fraction) -> float:
+    """Estimated quantile from histogram, upper bound of the bucket
+    containing it (inf for the last bucket)."""
+    target = stat["count"] * fraction
+    seen = 0
+    for index, count in enumerate(stat["buckets"]):
+        seen += count
+        if count and seen >= target:
+            return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+    return 0.0
+
+
+def summary(stats=None) -> str:
+    """one line per kind, slowest names first"""
+    stats = snapshot() if stats is None else stats
+    lines = []
+    for kind in sorted({key[0] for key in stats}):
+        parts = []
+        for (_, name), stat in sorted(
+            ((key, stat) for key, stat in stats.items() if key[0] == kind),
+            key=lambda item: -item[1]["seconds"],
+        ):
+            part = f"{name} {stat['count']}x {stat['seconds']:.2f}s"
+            part += f" p95<={quantile(stat, 0.95):g}s"
+            if stat["failures"]:
+                part += f" {stat['failures']} failed"
+            parts.append(part)
+        lines.append(f"{kind}: " + ", ".join(parts))
+    return "Timing: " + "; ".join(lines) if lines else "Timing: nothing measured"
+
+
+def to_dict(stats=None) -> dict:
+    """measurements as JSON serializable dict"""
+    stats = snapshot() if stats is None else stats
+    result = {}
+    bounds = [str(bound) for bound in BUCKETS] + ["+Inf"]
+    for (kind, name), stat in sorted(stats.items()):
+        result.setdefault(kind, {})[name] = dict(
+            stat,
+            seconds=round(stat["seconds"], 6),
+            buckets=dict(zip(bounds, stat["buckets"])),
+        )
+    return result
+
+
+def write_atomic(file, content):
+    """write file via temporary file, readers never see partial content"""
+    partial = f"{file}.{os.getpid()}.tmp"
+    with open(partial, "w", encoding="utf-8") as output:
+        output.write(content)
+    os.replace(partial, file)
+
+
+def write_json(file, stats=None):
+    """write measurements to JSON file"""
+    write_atomic(file, json.dumps(to_dict(stats), indent=2) + "\n")
+
+
+def write_prometheus(file, stats=None):
+    """write measurements in Prometheus text exposition format"""
+    stats = snapshot() if stats is None else stats
+    lines = []
+    for kind, label in (("nsdchat", "verb"), ("parser", "parser")):
+        keys = sorted(key for key in stats if key[0] == kind)
+        if not keys:
+            continue
+        prefix = f"pyp5_{kind}"
+        for metric, field, help_text in (
+            ("calls_total", "count", "number of calls"),
+            ("failures_total", "failures", "number of failed calls"),
+            ("bytes_total", "bytes", "bytes processed"),
+        ):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for key in keys:
+                labels = f'{label}="{key[1]}"'
+                lines.append(f"{prefix}_{metric}{{{labels}}} {stats[key][field]}")
+
+        lines.append(f"# HELP {prefix}_seconds duration of calls")
+        lines.append(f"# TYPE {prefix}_seconds histogram")
+        for key in keys:
+            stat = stats[key]
+            labels = f'{label}="{key[1]}"'
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ["+Inf"], stat["buckets"]):
+                cumulative += count
+                lines.append(
+                    f'{prefix}_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{prefix}_seconds_sum{{{labels}}} {stat['seconds']:.6f}")
+            lines.append(f"{prefix}_seconds_count{{{labels}}} {stat['count']}")
+    write_atomic(file, "\n".join(lines) + "\n")
@@ -0,0 +1,240 @@
+"""
+pyp5 - parsecache
+On-disk cache of parsed search items, keyed by file content.
+
+Parsing large AAFs with pyaaf2 takes seconds, the same lists are opened
+again and again (GUI, CLI retries, files moved back from failed/). Results
+are stored by SHA-256 of the file content, parser type and
+pyp5.PARSER_VERSION in a small SQLite file. Items are packed into a
+compressed binary blob, the least recently used entries are dropped once
+the cache grows beyond its size limit. Content hashes are remembered by
+path, size and mtime, so unchanged files are not even read again.
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+import pyp5
+
+
+PARSE_CACHE_FILE = f"{os.path.expanduser('~')}/.pyp5parsecache"
+MAX_BYTES = 256 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+MAGIC = b"P5PC"
+HEADER = struct.Struct("<4sBI")
+LENGTH = struct.Struct("<I")
+FORMAT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_used ON items (used);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+def pack(search_items) -> bytes:
+    """search items to compressed binary blob"""
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(search_items))]
+    for item in search_items:
+        data = item.encode("utf-8")
+        parts.append(LENGTH.pack(len(data)))
+        parts.append(data)
+    return zlib.compress(b"".join(parts))
+
+
+def unpack(blob) -> list:
+    """compressed binary blob to search items, raises ValueError if broken"""
+    try:
+        data = zlib.decompress(blob)
+        magic, version, count = HEADER.unpack_from(data)
+    except (zlib.error, struct.error) as error:
+        raise ValueError(f"broken cache entry: {error}") from error
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("unknown cache entry format")
+
+    search_items = []
+    offset = HEADER.size
+    for _ in range(count):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        search_items.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    if offset != len(data):
+        raise ValueError("broken cache entry: trailing data")
+    return search_items
+
+
+def digest(file) -> str:
+    """SHA-256 of file content"""
+    sha = hashlib.sha256()
+    with open(file, "rb") as input_file:
+        for block in iter(lambda: input_file.read(BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def filter_kind(file, ale_filter) -> str:
+    """kind of cache entry for items of ALE file filtered by ale_filter"""
+    if ale_filter and file.lower().endswith(".ale"):
+        return f":filter={ale_filter}"
+    return ""
+
+
+class ParseCache:
+    """content keyed cache in front of pyp5.parse_file"""
+
+    def __init__(self, file=PARSE_CACHE_FILE, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(file, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        """close on-disk store"""
+        self.db.close()
+
+    def stats(self) -> dict:
+        """hit/miss counters and size of cached entries"""
+        with self.lock:
+            entries, size = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM items"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def key(self, file, kind="") -> str:
+        """cache key of file: content hash, parser type, kind of result and
+        parser version. The content hash is reused while size and mtime are
+        unchanged."""
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest FROM hashes WHERE path = ? AND size = ? AND mtime = ?",
+                (path, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row is None:
+            row = (digest(path),)
+            with self.lock:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO hashes (path, size, mtime, digest) "
+                    "VALUES (?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, row[0]),
+                )
+                self.db.commit()
+        extension = os.path.splitext(file)[1].lower()
+        return f"{row[0]}:{extension}{kind}:{pyp5.PARSER_VERSION}"
+
+    def lookup(self, file, kind=""):
+        """Returns cached search items of file, None if not cached."""
+        try:
+            key = self.key(file, kind)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.db.execute(
+                "SELECT data FROM items WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                try:
+                    search_items = unpack(row[0])
+                except ValueError:
+                    self.db.execute("DELETE FROM items WHERE key = ?", (key,))
+                    self.db.commit()
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute(
+                "UPDATE items SET used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.db.commit()
+            self.hits += 1
+            return search_items
+
+    def store(self, file, search_items, kind=""):
+        """Cache search items of file. Parser errors are not cached."""
+        if not search_items or search_items[0] == "ERROR":
+            return
+        try:
+            key = self.key(file, kind)
+        except OSError:
+            return
+        blob = pack(search_items)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO items (key, data, size, used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        """drop least recently used entries beyond max_bytes, needs lock"""
+        total = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM items"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute(
+            "SELECT key, size FROM items ORDER BY used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM items WHERE key = ?", (key,))
+            total -= size
+        self.db.execute(
+            "DELETE FROM hashes WHERE digest NOT IN "
+            "(SELECT substr(key, 1, 64) FROM items)"
+        )
+
+    def lookup_paths(self, file):
+        """Returns cached locator paths of AAF file (item: [paths]),
+        None if not cached."""
+        pairs = self.lookup(file, ":paths")
+        if pairs is None:
+            return None
+        paths = {}
+        for item, path in zip(pairs[1::2], pairs[2::2]):
+            paths.setdefault(item, []).append(path)
+        return paths
+
+    def store_paths(self, file, paths):
+        """cache locator paths of AAF file like pyp5.parse_aaf_paths returns"""
+        pairs = ["PATHS"]
+        for item, item_paths in paths.items():
+            for path in item_paths:
+                pairs += [item, path]
+        self.store(file, pairs, ":paths")
+
+    def parse(self, file, ale_filter="") -> list:
+        """cached pyp5.parse_file"""
+        kind = filter_kind(file, ale_filter)
+        search_items = self.lookup(file, kind)
+        if search_items is None:
+            search_items = pyp5.parse_file(file, ale_filter)
+            self.store(file, search_items, kind)
+        return search_items
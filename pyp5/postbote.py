@@ -1,39 +1,272 @@
 """
-Simple function for sending mail message.
+Simple functions for sending mail messages.
+
+send() delivers a single message right away. send_async() hands messages
+to a background sender that reuses one authenticated SMTP connection,
+combines bursts of notifications to the same receivers into a digest and
+retries failed deliveries with backoff. Deliveries that still fail are
+logged to the app logger. smtplib, ssl and email are only imported once a
+mail is sent. Connection settings are read from the
+[NOTIFICATION] section of .pyp5conf:
+
+    smtp = mail.example.com
+    port = 587
+    starttls = yes
+    sender = pyp5@example.com
+    sender_name = pyp5
+    password = xxx
 
 Author: Philipp Buchinger <buchinger@proton.me>
 """
 
-import ssl
-from email.utils import formataddr
-from email.message import EmailMessage
-import smtplib
+import atexit
+import configparser
+import logging
+import os
+import queue
+import threading
+import time
+import logsetup
 
 
-def send(receiver, subject, content) -> str:
-    """send notifications via mail"""
-    port = 587  # For starttls
-    smtp = ""
-    sender = ""
-    sender_name = ""
-    password = ""
+CONF_FILE = f"{os.path.expanduser('~')}/.pyp5conf"
+COALESCE = 5.0
+RETRIES = 5
+BACKOFF = 2.0
+IDLE = 60.0
+# --- seconds per SMTP socket operation and for delivering queue at exit
+TIMEOUT = 30.0
+EXIT_TIMEOUT = 60.0
+
+_mailer = None
+_mailer_lock = threading.Lock()
 
+
+def read_settings(conf_file=CONF_FILE) -> dict:
+    """read SMTP settings from [NOTIFICATION] section of config file"""
+    config = configparser.ConfigParser()
+    config.read(conf_file, encoding="utf-8")
+    section = "NOTIFICATION"
+    return {
+        "smtp": config.get(section, "smtp", fallback=""),
+        "port": config.getint(section, "port", fallback=587),
+        "starttls": config.getboolean(section, "starttls", fallback=True),
+        "sender": config.get(section, "sender", fallback=""),
+        "sender_name": config.get(section, "sender_name", fallback=""),
+        "password": config.get(section, "password", fallback=""),
+    }
+
+
+def create_message(settings, receiver, subject, content):
+    """build mail message, receiver may be a string or list of addresses"""
+    from email.message import EmailMessage
+    from email.utils import formataddr
+
+    if not isinstance(receiver, str):
+        receiver = ", ".join(receiver)
     msg = EmailMessage()
-    msg["From"] = formataddr((f"{sender_name}", f"{sender}"))
+    msg["From"] = formataddr((f"{settings['sender_name']}", f"{settings['sender']}"))
     msg["To"] = receiver
     msg["Subject"] = f"{subject}"
     msg.set_content(content)
+    return msg
 
-    context = ssl.create_default_context()
 
-    with smtplib.SMTP(smtp, port) as server:
-        try:
-            # server.set_debuglevel(1)
-            server.ehlo()  # Can be omitted
-            server.starttls(context=context)
-            server.ehlo()  # Can be omitted
-            server.login(sender, password)
-            server.sendmail(sender, receiver, msg.as_string())
+def connect(settings):
+    """open SMTP connection, STARTTLS and login if configured"""
+    import smtplib
+    import ssl
+
+    server = smtplib.SMTP(settings["smtp"], settings["port"], timeout=TIMEOUT)
+    try:
+        # server.set_debuglevel(1)
+        server.ehlo()
+        if settings["starttls"]:
+            server.starttls(context=ssl.create_default_context())
+            server.ehlo()
+        if settings["password"]:
+            server.login(settings["sender"], settings["password"])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def send(receiver, subject, content) -> str:
+    """send notifications via mail"""
+    import smtplib
+
+    settings = read_settings()
+    msg = create_message(settings, receiver, subject, content)
+
+    try:
+        with connect(settings) as server:
+            server.send_message(msg)
             return "Mail sent."
-        except smtplib.SMTPException as error:
-            return str(error)
+    except (smtplib.SMTPException, OSError) as error:
+        return str(error)
+
+
+class Mailer(threading.Thread):
+    """background sender with one reused SMTP connection"""
+
+    def __init__(
+        self, settings=None, coalesce=COALESCE, retries=RETRIES, backoff=BACKOFF
+    ):
+        super().__init__(daemon=True)
+        self.settings = settings or read_settings()
+        self.coalesce = coalesce
+        self.retries = retries
+        self.backoff = backoff
+        self.messages = queue.Queue()
+        self.server = None
+        self.errors = []
+        self.closing = False
+
+    def enqueue(self, receiver, subject, content):
+        """queue message for delivery, returns immediately"""
+        self.messages.put((receiver, subject, content))
+
+    def flush(self, timeout=None) -> bool:
+        """wait until all queued messages are handled"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while self.messages.unfinished_tasks:
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=None) -> list:
+        """Deliver remaining messages and stop sender.
+        Returns the delivery errors so far."""
+        self.closing = True
+        self.messages.put(None)
+        self.join(timeout)
+        if self.is_alive():
+            self.errors.append(f"messages not sent within {timeout} seconds")
+            logging.getLogger(logsetup.APP).error(
+                "Mail: messages not sent within %s seconds", timeout
+            )
+        return self.errors
+
+    def run(self):
+        while True:
+            try:
+                first = self.messages.get(timeout=IDLE)
+            except queue.Empty:
+                self.disconnect()
+                continue
+            if first is None:
+                self.messages.task_done()
+                break
+
+            # --- collect everything arriving within the coalesce window
+            burst = [first]
+            stop = False
+            end = time.monotonic() + (0 if self.closing else self.coalesce)
+            while True:
+                try:
+                    message = self.messages.get(timeout=max(0, end - time.monotonic()))
+                except queue.Empty:
+                    break
+                if message is None:
+                    stop = True
+                    break
+                burst.append(message)
+
+            for receiver, subject, content in self.digest(burst):
+                self.deliver(receiver, subject, content)
+            for _ in range(len(burst) + stop):
+                self.messages.task_done()
+            if stop:
+                break
+        self.disconnect()
+
+    @staticmethod
+    def digest(burst) -> list:
+        """combine messages to the same receivers into one digest each"""
+        groups = {}
+        for receiver, subject, content in burst:
+            key = receiver if isinstance(receiver, str) else tuple(receiver)
+            groups.setdefault(key, []).append((receiver, subject, content))
+
+        messages = []
+        for group in groups.values():
+            if len(group) == 1:
+                messages.append(group[0])
+                continue
+            subjects = "\n".join(f"- {subject}" for _, subject, _ in group)
+            bodies = "\n\n".join(
+                f"=== {subject} ===\n{content}" for _, subject, content in group
+            )
+            messages.append(
+                (
+                    group[0][0],
+                    f"{len(group)} notifications",
+                    f"{subjects}\n\n{bodies}",
+                )
+            )
+        return messages
+
+    def deliver(self, receiver, subject, content):
+        """send message over shared connection, retry with backoff"""
+        import smtplib
+
+        if not self.settings["smtp"]:
+            self.failed(subject, "no SMTP server configured")
+            return
+        msg = create_message(self.settings, receiver, subject, content)
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                if self.server is None:
+                    self.server = connect(self.settings)
+                self.server.send_message(msg)
+                return
+            except (smtplib.SMTPException, OSError) as error:
+                self.disconnect()
+                if attempt == self.retries:
+                    self.failed(subject, error)
+                    return
+                time.sleep(delay)
+                delay *= 2
+
+    def failed(self, subject, error):
+        """remember and log message that could not be delivered"""
+        self.errors.append(f"{subject}: {error}")
+        logging.getLogger(logsetup.APP).error("Mail '%s' not sent: %s", subject, error)
+
+    def disconnect(self):
+        """close shared connection"""
+        if self.server is None:
+            return
+        import smtplib
+
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+
+
+def send_async(receiver, subject, content):
+    """queue notification on the shared background sender"""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer()
+            _mailer.start()
+            # --- registered after logsetup.start, so it runs before its stop
+            atexit.register(close)
+        _mailer.enqueue(receiver, subject, content)
+
+
+def close(timeout=EXIT_TIMEOUT) -> list:
+    """Deliver queued notifications, waits at most timeout seconds.
+    Returns the delivery errors of the background sender."""
+    global _mailer
+    with _mailer_lock:
+        mailer, _mailer = _mailer, None
+    if mailer is None:
+        return []
+    return mailer.close(timeout)
@@ -6,84 +6,370 @@ and create and start Archiware P5 restore selections.
 Author: Philipp Buchinger <buchinger@proton.me>
 """
 
+from collections import namedtuple
 from subprocess import check_output
-import aaf2
-
-
+from urllib.parse import unquote, urlparse
+import functools
+import os
+import time
+import aletable
+import metrics
+import session
+
+
+# --- items per findentry call, larger batches pay off for mostly missing
+# --- items and exact paths (not yet confirmed against a real P5 server)
+BATCH_SIZE = 1
+# --- commands written to a session at once, keeps pipe buffers from filling
+PIPELINE = 100
+VOLUME_KEYS = ("label", "barcode", "pool", "mode")
+# --- bump when parsers return different items, invalidates parse caches
+PARSER_VERSION = 2
+NAME_TERM = "name *= '{}'"
+PATH_TERM = "path == '{}'"
+
+EdlEvent = namedtuple(
+    "EdlEvent",
+    "event reel track transition clip_name source_file "
+    "source_in source_out record_in record_out",
+)
+
+
+def _measured(name):
+    """record duration, file size and failures of parser in metrics"""
+
+    def decorator(parse):
+        @functools.wraps(parse)
+        def wrapper(file, *args):
+            with metrics.timed("parser", name) as result:
+                parsed = parse(file, *args)
+                search_items = parsed[0] if isinstance(parsed, tuple) else parsed
+                result["failed"] = search_items[:1] == ["ERROR"]
+                try:
+                    result["bytes"] = os.path.getsize(file)
+                except OSError:
+                    pass
+            return parsed
+
+        return wrapper
+
+    return decorator
+
+
+def iter_ale(file):
+    """Yield items to restore from supplied ALE file one by one.
+    Reads file line by line, so memory stays flat for very large logs.
+    Raises IOError if file can't be read, ValueError on malformed files."""
+    section = "HEADING"
+    index = None
+
+    with open(file, "r", encoding="utf-8") as ale_file:
+        for line in ale_file:
+            line = line.rstrip("\r\n")
+
+            # --- section names stand on a line of their own
+            if line in ("Heading", "Column", "Data"):
+                section = line.upper()
+                if section == "DATA" and index is None:
+                    raise ValueError("No 'Source File' column found.")
+                continue
+
+            if section == "COLUMN" and index is None and line:
+                columns = [column.strip() for column in line.split("\t")]
+                if "Source File" not in columns:
+                    raise ValueError("No 'Source File' column found.")
+                index = columns.index("Source File")
+            elif section == "DATA" and line:
+                fields = line.split("\t")
+                if index < len(fields) and fields[index]:
+                    yield fields[index]
+
+
+@_measured("ale")
 def parse_ale(file) -> list:
     """parse supplied ALE file for items to restore"""
-    search_items = []
-    state = "INIT"
-    data = 0
-    index = 0
-
     try:
-        with open(file, "r", encoding="utf-8") as ale_file:
-            lines = ale_file.readlines()
-    except IOError as error:
+        search_items = list(iter_ale(file))
+    except (IOError, ValueError) as error:
         return ["ERROR", f"{str(error)}"]
 
-    # -- search for 'Column' and 'Data' portions to get required index
-    # -- of search entries and their starting point in file
-    for line_nr, line in enumerate(lines):
-        if "Column" in line:
-            state = "COLUMN"
-            for index, column in enumerate(lines[line_nr + 1].split("\t")):
-                if "Source File" in column:
-                    break
-        if "Data" in line:
-            state = "DATA"
-            data = line_nr + 1
-            break
-
-    if state != "DATA" or len(lines[data:]) == 0:
+    if not search_items:
         return ["ERROR", "No search items found."]
 
-    for line in lines[data:]:
-        search_items.append(line.split("\t")[index].strip("\n"))
-
     return search_items
 
 
-def parse_aaf(file) -> list:
-    """parse supplied AAF file for items to restore"""
-    search_items = []
-
+@_measured("ale")
+def parse_ale_filtered(file, expression) -> list:
+    """Parse supplied ALE file for items to restore of rows matching filter
+    expression (see aletable), e.g. "Circled = Y and Tape ~ 'A00*'"."""
     try:
-        with aaf2.open(file) as aaf_file:
-            # aaf_file.dump()
-            source_mobs = aaf_file.content.sourcemobs()
-            for mob in source_mobs:
-                search_items.append(mob.name)
-                # for loc in mob.descriptor.locator:
-                #    print(loc['URLString'].value)
-    except IOError as error:
+        ale_filter = aletable.Filter(expression)
+        table = aletable.read_ale(file, ["Source File"] + ale_filter.columns)
+        rows = ale_filter.select(table)
+    except (IOError, ValueError) as error:
         return ["ERROR", f"{str(error)}"]
 
+    source_files = table.columns["Source File"]
+    search_items = [source_files[index] for index in rows if source_files[index]]
+    if not search_items:
+        return ["ERROR", f"No search items match filter: {expression}"]
+
     return search_items
 
 
+def read_source_mobs(file) -> list:
+    """Read only name, mob id and essence locators of all source mobs in
+    supplied AAF file. Returns list of (mob_id, name, locators), each mob id
+    only once. Extensions are not loaded and compositions are not touched."""
+    # --- pyaaf2 takes a while to import, only load it for AAF files
+    import aaf2
+
+    source_mobs = {}
+
+    with aaf2.open(file, "r", extensions=False) as aaf_file:
+        for mob in aaf_file.content.mobs:
+            if not isinstance(mob, aaf2.mobs.SourceMob):
+                continue
+            mob_id = str(mob.mob_id)
+            if mob_id in source_mobs:
+                continue
+            locators = []
+            descriptor = mob.descriptor
+            if descriptor is not None and "Locator" in descriptor:
+                for loc in descriptor["Locator"]:
+                    if "URLString" in loc:
+                        locators.append(loc["URLString"].value)
+            source_mobs[mob_id] = (mob_id, mob.name, locators)
+
+    return list(source_mobs.values())
+
+
+def locator_path(url) -> str:
+    """file path of essence locator URL (file:///Volumes/...), plain paths
+    are returned unchanged, empty string for other URLs"""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return unquote(parsed.path)
+    if not parsed.scheme and url.startswith("/"):
+        return url
+    return ""
+
+
+@_measured("aaf")
+def parse_aaf_paths(file) -> tuple:
+    """Parse supplied AAF file for items to restore and the file paths of
+    their essence locators. Returns (search_items, {item: [paths]})."""
+    try:
+        source_mobs = read_source_mobs(file)
+    except IOError as error:
+        return ["ERROR", f"{str(error)}"], {}
+
+    paths = {}
+    for _, name, locators in source_mobs:
+        if not name:
+            continue
+        for path in filter(None, map(locator_path, locators)):
+            if path not in paths.setdefault(name, []):
+                paths[name].append(path)
+    return [name for _, name, _ in source_mobs if name], paths
+
+
+def parse_aaf(file) -> list:
+    """parse supplied AAF file for items to restore"""
+    return parse_aaf_paths(file)[0]
+
+
+def _timed_parse_aaf(file) -> tuple:
+    """parse_aaf_paths with elapsed seconds, runs in worker process"""
+    start = time.perf_counter()
+    try:
+        search_items, paths = parse_aaf_paths(file)
+    except Exception as error:
+        search_items, paths = ["ERROR", f"{str(error)}"], {}
+    return search_items, time.perf_counter() - start, paths
+
+
+def parse_aafs(files, workers=None) -> dict:
+    """Parse supplied AAF files in parallel on a process pool.
+    Returns dict of file: (search_items, seconds, paths) in order of files,
+    paths like parse_aaf_paths."""
+    files = list(files)
+    if len(files) < 2 or workers == 1:
+        return {file: _timed_parse_aaf(file) for file in files}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(files, executor.map(_timed_parse_aaf, files)))
+
+    # --- measurements of worker processes are lost, record them here
+    for file, (search_items, seconds, _) in results.items():
+        try:
+            size = os.path.getsize(file)
+        except OSError:
+            size = 0
+        metrics.record("parser", "aaf", seconds, size, search_items[:1] == ["ERROR"])
+    return results
+
+
+def iter_edl(file):
+    """Yield events of supplied CMX3600/File128 EDL file one by one.
+    Clip name and source file are taken from the '* FROM CLIP NAME:',
+    '* TO CLIP NAME:' and '* SOURCE FILE:' comments following an event.
+    Raises IOError if file can't be read."""
+    pending = []
+
+    with open(file, "r", encoding="utf-8") as edl_file:
+        for line in edl_file:
+            fields = line.split()
+            if not fields:
+                continue
+
+            if fields[0].isdigit() and len(fields) >= 8:
+                # --- dissolves/wipes repeat the event number for the incoming clip
+                if pending and pending[0].event != fields[0]:
+                    yield from pending
+                    pending = []
+                timecodes = fields[-4:]
+                pending.append(
+                    EdlEvent(
+                        fields[0],
+                        fields[1],
+                        fields[2],
+                        fields[3],
+                        "",
+                        "",
+                        *timecodes,
+                    )
+                )
+                continue
+
+            if not pending or not line.startswith("*"):
+                continue
+
+            comment = line[1:].strip()
+            key, _, value = comment.partition(":")
+            key = key.strip().upper()
+            value = value.strip()
+            if key == "FROM CLIP NAME":
+                pending[0] = pending[0]._replace(clip_name=value)
+            elif key == "TO CLIP NAME":
+                pending[-1] = pending[-1]._replace(clip_name=value)
+            elif key == "SOURCE FILE":
+                for index, event in enumerate(pending):
+                    if not event.source_file:
+                        pending[index] = event._replace(source_file=value)
+                        break
+
+    yield from pending
+
+
+@_measured("edl")
 def parse_edl(file) -> list:
-    """parse supplied EDL file for items to restore"""
-    search_items = []
+    """parse supplied EDL file for items to restore.
+    Every event is searched by its source file, clip name or reel name,
+    whichever is set first. Events with the same source are returned once,
+    different clips on the same reel (camera roll) are all kept. Black
+    reels and aux reels without clip are skipped."""
+    search_items = {}
 
     try:
-        with open(file, "r", encoding="utf-8") as edl_file:
-            lines = edl_file.readlines()
+        for event in iter_edl(file):
+            reel = event.reel.upper()
+            if reel in ("BL", "BLK", "BLACK"):
+                continue
+            candidates = [
+                os.path.basename(event.source_file),
+                event.clip_name,
+                event.reel if reel != "AX" else "",
+            ]
+            item = next((item for item in candidates if item), "")
+            if item:
+                search_items[item] = None
     except IOError as error:
         return ["ERROR", f"{str(error)}"]
 
-    for line in lines:
-        if line[:2].isdigit():
-            search_items.append(line.split()[1])
-
-    return search_items
+    return list(search_items)
+
+
+def parse_file(file, ale_filter="") -> list:
+    """Parse supplied ALE, AAF or EDL file, chosen by file extension.
+    Only rows of ALE files matching ale_filter are used if it is set."""
+    extension = os.path.splitext(file)[1].lower()
+    if ale_filter and extension == ".ale":
+        return parse_ale_filtered(file, ale_filter)
+    parser = PARSERS.get(extension)
+    if parser is None:
+        return ["ERROR", "Unsupported file type."]
+    return parser(file)
+
+
+PARSERS = {".ale": parse_ale, ".aaf": parse_aaf, ".edl": parse_edl}
+
+
+def nsdchat_command(nsdchat, *args) -> str:
+    """Run single nsdchat command. Commands are routed through a pool of
+    long-lived nsdchat sessions, falls back to one process per command
+    if session.POOL_SIZE is set to 0."""
+    with metrics.timed("nsdchat", command_verb(args)) as result:
+        if session.POOL_SIZE < 1:
+            reply = check_output(nsdchat + ["-c", *args]).decode("utf-8")
+        else:
+            reply = session.get_pool(nsdchat).run(args)
+        result["bytes"] = len(reply)
+        result["failed"] = not reply.strip()
+    return reply
+
+
+def nsdchat_commands(nsdchat, commands) -> list:
+    """Run several nsdchat commands (lists of arguments), returns their
+    replies in order. Commands are pipelined on a single session, PIPELINE
+    commands per round-trip, one process per command if session.POOL_SIZE
+    is set to 0."""
+    replies = []
+    for start in range(0, len(commands), PIPELINE):
+        chunk = [tuple(args) for args in commands[start:start + PIPELINE]]
+        begin = time.perf_counter()
+        try:
+            if session.POOL_SIZE < 1:
+                chunk_replies = [
+                    check_output(nsdchat + ["-c", *args]).decode("utf-8")
+                    for args in chunk
+                ]
+            else:
+                chunk_replies = session.get_pool(nsdchat).run_many(chunk)
+        except Exception:
+            seconds = (time.perf_counter() - begin) / len(chunk)
+            for args in chunk:
+                metrics.record("nsdchat", command_verb(args), seconds, failed=True)
+            raise
+        # --- time of the round-trip is shared by its commands
+        seconds = (time.perf_counter() - begin) / len(chunk)
+        for args, reply in zip(chunk, chunk_replies):
+            metrics.record(
+                "nsdchat", command_verb(args), seconds, len(reply), not reply.strip()
+            )
+        replies += chunk_replies
+    return replies
+
+
+def command_verb(args) -> str:
+    """verb of nsdchat command used as metrics key, e.g. findentry, label"""
+    if args[:2] == ("RestoreSelection", "create"):
+        return "create"
+    if len(args) >= 3 and args[0] in ("RestoreSelection", "Volume", "ArchiveIndex"):
+        return args[2]
+    return args[0] if args else ""
 
 
 def check_p5_connection(nsdchat) -> str:
-    """Check if connection to p5 server can be established."""
+    """Check if connection to p5 server can be established.
+    Returns empty string on success, error message on failure."""
     try:
-        return check_output(nsdchat + ["-c", "srvinfo", "hostname"]).decode("utf-8")
+        if nsdchat_command(nsdchat, "srvinfo", "hostname").strip():
+            return ""
+        return get_error(nsdchat).strip() or "No reply from P5 server."
     except Exception as error:
         return str(error)
 
@@ -91,88 +377,250 @@ def check_p5_connection(nsdchat) -> str:
 def new_restore_selection(nsdchat) -> str:
     """Creates a new restore selection.
     Returns restore ID on success, empty string on failure."""
-    return check_output(
-        nsdchat
-        + [
-            "-c",
-            "RestoreSelection",
-            "create",
-            "localhost",
-            "/Volumes/RESTORE/Archiware/",
-        ]
-    ).decode("utf-8")
+    return nsdchat_command(
+        nsdchat,
+        "RestoreSelection",
+        "create",
+        "localhost",
+        "/Volumes/RESTORE/Archiware/",
+    )
 
 
 def find_entry(nsdchat, restore_selection, archive_id, item) -> str:
     """Searches for supplied item and adds it to restore selection.
     Returns number of found entries on success, empty string on failure.
     When multiple entries are found, only newest entry gets added."""
-    return check_output(
-        nsdchat
-        + [
-            "-c",
-            "RestoreSelection",
-            restore_selection,
-            "findentry",
-            archive_id,
-            f"{{name *= '{item}'}}",
-        ]
-    ).decode("utf-8")
+    return nsdchat_command(
+        nsdchat,
+        "RestoreSelection",
+        restore_selection,
+        "findentry",
+        archive_id,
+        f"{{name *= '{item}'}}",
+    )
+
+
+def find_entries(
+    nsdchat,
+    restore_selection,
+    archive_id,
+    items,
+    batch_size=BATCH_SIZE,
+    jobs=1,
+    term=NAME_TERM,
+) -> dict:
+    """Searches for supplied items in batches of OR-combined filters and adds
+    them to restore selection. Returns dict of item: number of found entries
+    in order of items, "0" or empty string for items not found.
+    Batches are split until every item is resolved, see resolve_batch.
+    Batches pay off if most items are missing or searched by exact path,
+    with mostly found name searches the splitting costs extra calls.
+    With jobs > 1 up to jobs batches are searched concurrently."""
+    results = {}
+    items = list(dict.fromkeys(items))
+    batch_size = max(1, batch_size)
+    batches = [
+        items[start:start + batch_size] for start in range(0, len(items), batch_size)
+    ]
+
+    if jobs > 1 and len(batches) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for future in [
+                executor.submit(
+                    _find_batch,
+                    nsdchat,
+                    restore_selection,
+                    archive_id,
+                    batch,
+                    results,
+                    term,
+                )
+                for batch in batches
+            ]:
+                future.result()
+    else:
+        for batch in batches:
+            _find_batch(nsdchat, restore_selection, archive_id, batch, results, term)
+
+    return {item: results[item] for item in items}
+
+
+def find_paths(
+    nsdchat, restore_selection, archive_id, paths, batch_size=BATCH_SIZE, jobs=1
+) -> dict:
+    """Adds entries with exactly the supplied paths to restore selection.
+    Returns dict of path: number of found entries like find_entries."""
+    return find_entries(
+        nsdchat, restore_selection, archive_id, paths, batch_size, jobs, PATH_TERM
+    )
+
+
+def find_entries_exact(
+    nsdchat,
+    restore_selection,
+    archive_id,
+    items,
+    paths,
+    batch_size=BATCH_SIZE,
+    jobs=1,
+    fallback=None,
+) -> dict:
+    """Adds items by the exact paths supplied in paths (item: [paths]),
+    cheap and never matching the wrong clip. Only items none of whose paths
+    is archived are searched by name with fallback (find_entries).
+    Returns dict of item: number of found entries like find_entries."""
+    fallback = fallback or find_entries
+    items = list(dict.fromkeys(items))
+    candidates = [path for item in items for path in paths.get(item, ())]
+    found = find_paths(
+        nsdchat, restore_selection, archive_id, candidates, batch_size, jobs
+    )
+
+    results = {}
+    for item in items:
+        count = sum(
+            int(found[path])
+            for path in paths.get(item, ())
+            if found.get(path, "").isdigit()
+        )
+        if count:
+            results[item] = str(count)
+
+    missing = [item for item in items if item not in results]
+    if missing:
+        results.update(
+            fallback(
+                nsdchat, restore_selection, archive_id, missing, batch_size, jobs
+            )
+        )
+    return {item: results[item] for item in items}
+
+
+def batch_filter(batch, term) -> str:
+    """OR-combined findentry filter of batch of items"""
+    search = " || ".join(term.format(item) for item in batch)
+    return f"{{{search}}}"
+
+
+def resolve_batch(batch, found):
+    """Decide what findentry reply found of an OR-combined batch tells about
+    its items. Returns dict of item: number of found entries if it settles
+    all items, None if the batch has to be split. Even a path can match
+    several archived versions, so only a reply of 0 settles a batch."""
+    if len(batch) == 1:
+        return {batch[0]: found}
+    if found == "0":
+        return {item: "0" for item in batch}
+    return None
+
+
+def split_batch(batch, found) -> list:
+    """Parts to search a batch in that could not be resolved. Batches with
+    many matches most likely hold few missing items, bisecting would cost
+    more calls than searching every item on its own."""
+    if found.isdigit() and int(found) * 2 >= len(batch):
+        return [[item] for item in batch]
+    half = len(batch) // 2
+    return [batch[:half], batch[half:]]
+
+
+def _find_batch(nsdchat, restore_selection, archive_id, batch, results, term):
+    """Resolve single batch of items, split it until every item is resolved.
+    Entries are added by the first search of a batch already, parts are
+    only searched again to tell which item they belong to."""
+    found = nsdchat_command(
+        nsdchat,
+        "RestoreSelection",
+        restore_selection,
+        "findentry",
+        archive_id,
+        batch_filter(batch, term),
+    ).strip("\n")
+
+    resolved = resolve_batch(batch, found)
+    if resolved is not None:
+        results.update(resolved)
+        return
+    for part in split_batch(batch, found):
+        _find_batch(nsdchat, restore_selection, archive_id, part, results, term)
+
+
+def get_inventory(nsdchat, archive_id, since=0) -> str:
+    """Lists entries of archive index modified after since (unix time).
+    Returns path of inventory file with one tab separated line of
+    path, volume and mtime per entry, empty string on failure."""
+    args = ["ArchiveIndex", archive_id, "inventory", "/"]
+    if since:
+        args.append(f"{{mtime > {since}}}")
+    return nsdchat_command(nsdchat, *args)
+
+
+def get_entries(nsdchat, restore_selection) -> str:
+    """Returns number of entries in restore selection on success,
+    empty string on failure."""
+    return nsdchat_command(nsdchat, "RestoreSelection", restore_selection, "entries")
 
 
 def get_volumes(nsdchat, restore_selection):
     """Returns needed volumes for restore on success,
     empty string on failure."""
-    return check_output(
-        nsdchat + ["-c", "RestoreSelection", restore_selection, "volumes"]
-    ).decode("utf-8")
+    return nsdchat_command(nsdchat, "RestoreSelection", restore_selection, "volumes")
 
 
 def get_label(nsdchat, volume) -> str:
     """Returns label of volume on success, empty string on failure."""
-    return check_output(nsdchat + ["-c", "Volume", volume, "label"]).decode("utf-8")
+    return nsdchat_command(nsdchat, "Volume", volume, "label")
 
 
 def get_barcode(nsdchat, volume) -> str:
     """Returns label of volume on success, empty string on failure."""
-    return check_output(nsdchat + ["-c", "Volume", volume, "barcode"]).decode("utf-8")
+    return nsdchat_command(nsdchat, "Volume", volume, "barcode")
+
+
+def get_volume_info(nsdchat, volumes, keys=VOLUME_KEYS) -> dict:
+    """Returns dict of volume: {key: value} of supplied volumes, label,
+    barcode, pool and mode (media state like Appendable, Full) by default.
+    All values are fetched in one round-trip, failed ones are empty."""
+    volumes = list(dict.fromkeys(volumes))
+    replies = iter(
+        nsdchat_commands(
+            nsdchat, [("Volume", volume, key) for volume in volumes for key in keys]
+        )
+    )
+    return {
+        volume: {key: next(replies).strip("\n") for key in keys} for volume in volumes
+    }
 
 
 def submit_restore(nsdchat, restore_selection) -> str:
     """Submits restore selection for processing.
     Returns job ID on success, empty string on failure."""
-    return (
-        check_output(nsdchat + ["-c", "RestoreSelection", restore_selection, "submit"])
-        .decode("utf-8")
-        .strip()
-    )
+    return nsdchat_command(
+        nsdchat, "RestoreSelection", restore_selection, "submit"
+    ).strip()
 
 
 def describe(nsdchat, restore_selection, title) -> str:
     """Set description for job monitor"""
-    return (
-        check_output(
-            nsdchat + ["-c", "RestoreSelection", restore_selection, "describe", title]
-        )
-        .decode("utf-8")
-        .strip()
-    )
+    return nsdchat_command(
+        nsdchat, "RestoreSelection", restore_selection, "describe", title
+    ).strip()
 
 
 def destroy(nsdchat, restore_selection) -> str:
     """Set description for job monitor"""
-    return (
-        check_output(nsdchat + ["-c", "RestoreSelection", restore_selection, "destroy"])
-        .decode("utf-8")
-        .strip()
-    )
+    return nsdchat_command(
+        nsdchat, "RestoreSelection", restore_selection, "destroy"
+    ).strip()
 
 
 def get_error(nsdchat) -> str:
     """Get last error from nsdchat application"""
-    return check_output(nsdchat + ["-c", "geterror"]).decode("utf-8")
+    return nsdchat_command(nsdchat, "geterror")
 
 
 def get_archive_index(nsdchat) -> str:
     """Get all available archive plan indexes"""
-    return check_output(nsdchat + ["-c", "ArchivPlan", "names"]).decode("utf-8")
+    return nsdchat_command(nsdchat, "ArchivPlan", "names")
@@ -5,27 +5,25 @@ CLI wrapper for pyp5 module.
 Author: Philipp Buchinger <buchinger@proton.me>
 """
 
+from collections import namedtuple
 import argparse
 import configparser
 import glob
 import logging
 import os
 import sys
+import aletable
+import cache
+import index
+import journal
+import logsetup
+import metrics
+import parsecache
 import postbote
 import pyp5
-
-
-def init_logger(name, level, file):
-    """initialize loggers"""
-    formatter = logging.Formatter(
-        "%(asctime)s %(levelname)-8s %(message)s", "%Y-%m-%d %H:%M:%S"
-    )
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    handler = logging.FileHandler(file)
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    return logger
+import scheduler
+import session
+import watcher
 
 
 def read_conf():
@@ -49,16 +47,497 @@ def read_conf():
         return "ERROR", f"{conf_file}: {str(error)}", ""
 
     if not archive_id or not all(__ for __ in nsdchat):
-        return "ERROR", f"{conf_file}: Empty entries found."
+        return "ERROR", f"{conf_file}: Empty entries found.", ""
 
     return archive_id, nsdchat, mail
 
 
+Job = namedtuple(
+    "Job", "title restore_selection volumes volume_ids files log loggers journal"
+)
+
+
+class RestoreRun:
+    """shared state of a batch run: config, P5 connection, caches"""
+
+    def __init__(self, current_dir, args, app_logger, conf):
+        self.current_dir = current_dir
+        self.args = args
+        self.app_logger = app_logger
+        self.archive_id, self.nsdchat, self.mail = conf
+        self.volume_cache = cache.VolumeCache(ttl=args.volume_ttl)
+        if args.refresh_volumes:
+            self.volume_cache.invalidate()
+        self.parse_cache = None if args.no_parse_cache else parsecache.ParseCache()
+        self.archive_index = None
+        self.paths = {}
+        self.scheduler = scheduler.Scheduler() if args.schedule else None
+        self.outstanding = {}
+        self.failed = set()
+
+    def open_index(self) -> bool:
+        """open and refresh local archive index if requested"""
+        if not self.args.index:
+            return True
+        self.archive_index = index.ArchiveIndex(self.args.index)
+        try:
+            count = self.archive_index.refresh(
+                self.nsdchat, self.archive_id, self.args.index_rebuild
+            )
+        except IOError as error:
+            self.app_logger.critical("Couldn't refresh archive index: %s", error)
+            return False
+        self.app_logger.info("Refreshed archive index, %s new entries.", count)
+        return True
+
+    def refresh_index(self):
+        """refresh archive index once it is older than --index-ttl, a failed
+        refresh keeps the old snapshot (misses are searched on the server)"""
+        if self.archive_index is None or not self.archive_index.stale(
+            self.args.index_ttl
+        ):
+            return
+        try:
+            count = self.archive_index.refresh(
+                self.nsdchat, self.archive_id, self.args.index_rebuild
+            )
+        except IOError as error:
+            self.app_logger.error("Couldn't refresh archive index: %s", error)
+            return
+        self.app_logger.info("Refreshed archive index, %s new entries.", count)
+
+    def move(self, file, folder) -> str:
+        """atomically move file into folder next to restore/"""
+        target_dir = os.path.join(self.current_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(file))
+        try:
+            os.replace(file, target)
+        except OSError as error:
+            self.app_logger.error('Could not move "%s" to %s: %s', file, folder, error)
+            return file
+        return target
+
+    def open_journal(self, title, files) -> journal.Journal:
+        """journal of job, named after its input file or merged title"""
+        if len(files) == 1:
+            name = os.path.basename(files[0])
+        else:
+            name = title.replace("/", "-").replace(" ", "_")
+        return journal.Journal(
+            os.path.join(self.current_dir, "journal", f"{name}.journal"),
+            journal.file_signature(files, self.archive_id),
+        )
+
+    def parse(self, file) -> list:
+        """parse file, unchanged files are answered from parse cache.
+        Locator paths of AAF files are kept for exact-path lookups."""
+        if not file.lower().endswith(".aaf"):
+            if self.parse_cache is None:
+                return pyp5.parse_file(file, self.args.ale_filter)
+            return self.parse_cache.parse(file, self.args.ale_filter)
+
+        search_items = None
+        if self.parse_cache is not None:
+            search_items = self.parse_cache.lookup(file)
+        if search_items is not None and self.load_paths(file):
+            return search_items
+
+        search_items, self.paths[file] = pyp5.parse_aaf_paths(file)
+        if self.parse_cache is not None:
+            self.parse_cache.store(file, search_items)
+            self.parse_cache.store_paths(file, self.paths[file])
+        return search_items
+
+    def load_paths(self, file) -> bool:
+        """Load cached locator paths of AAF file.
+        Returns False if they are not cached."""
+        paths = self.parse_cache.lookup_paths(file) if self.parse_cache else None
+        if paths is None:
+            return False
+        self.paths[file] = paths
+        return True
+
+    def search(self, restore_selection, items, paths) -> dict:
+        """Add items to restore selection, by exact locator path where
+        known, by name otherwise. Returns dict of item: found entries."""
+        find_entries = (
+            self.archive_index.find_entries if self.archive_index else pyp5.find_entries
+        )
+        if paths and not self.args.no_exact_paths:
+            return pyp5.find_entries_exact(
+                self.nsdchat,
+                restore_selection,
+                self.archive_id,
+                items,
+                paths,
+                self.args.batch_size,
+                self.args.jobs,
+                find_entries,
+            )
+        return find_entries(
+            self.nsdchat,
+            restore_selection,
+            self.archive_id,
+            items,
+            self.args.batch_size,
+            self.args.jobs,
+        )
+
+    def check_items(self, file, search_items) -> bool:
+        """log parser errors and move broken files to failed/"""
+        if not search_items:
+            search_items = ["ERROR", "No search items found."]
+
+        if search_items[0] == "ERROR":
+            self.app_logger.error('"%s": %s', file, {search_items[1]})
+            self.move(file, "failed")
+            return False
+        return True
+
+    def process(self, file, search_items) -> bool:
+        """create, fill and submit (or schedule) restore selection for
+        single file. Returns False if restore selection failed."""
+        if not self.check_items(file, search_items):
+            return False
+        job = self.prepare(os.path.basename(file), {file: search_items})
+        if job is None:
+            return False
+        self.queue(job)
+        return True
+
+    def process_merged(self, files_items, selections=1) -> int:
+        """Union and de-duplicate search items of all files and restore them
+        with a fixed number of shared restore selections, so footage used by
+        several files is read from tape only once.
+        Returns number of restore selections created."""
+        files_items = {
+            file: search_items
+            for file, search_items in files_items.items()
+            if self.check_items(file, search_items)
+        }
+
+        # --- item: files it was requested by, in order of appearance
+        owners = {}
+        for file, search_items in files_items.items():
+            for item in search_items:
+                owners.setdefault(item, []).append(file)
+
+        items = sorted(owners)
+        self.app_logger.info(
+            "Merged %s items of %s files into %s unique items.",
+            sum(len(search_items) for search_items in files_items.values()),
+            len(files_items),
+            len(items),
+        )
+
+        selections = max(1, min(selections, len(items)))
+        chunk = -(-len(items) // selections) if items else 1
+        jobs = []
+        failed = set()
+        for number, start in enumerate(range(0, len(items), chunk), start=1):
+            group = {}
+            for item in items[start:start + chunk]:
+                for file in owners[item]:
+                    group.setdefault(file, []).append(item)
+            job = self.prepare(f"merged {number}/{selections}", group)
+            if job is None:
+                failed.update(group)
+            else:
+                jobs.append(job)
+
+        # --- files stay in restore/ if any of their selections failed
+        self.failed.update(failed)
+        for job in jobs:
+            self.queue(job)
+        self.failed -= {file for file in failed if not self.outstanding.get(file)}
+        return len(jobs)
+
+    def prepare(self, title, files_items):
+        """Create and fill restore selection for items of one or more files
+        and resolve its volumes. Every file gets its own log with its own
+        missing items. Returns Job ready for submission, None on failure."""
+        args = self.args
+        nsdchat = self.nsdchat
+        app_logger = self.app_logger
+        files = list(files_items)
+        names = ", ".join(f'"{os.path.basename(file)}"' for file in files)
+        before = metrics.snapshot()
+
+        # --- resume from journal of an interrupted run of the same files
+        job_journal = self.open_journal(title, files)
+        state = job_journal.state
+        stale = job_journal.stale
+        if stale.restore_selection and not stale.job_id:
+            pyp5.destroy(nsdchat, stale.restore_selection)
+            app_logger.info(
+                "Destroyed restore selection %s of changed %s",
+                stale.restore_selection,
+                names,
+            )
+
+        restore_selection = state.restore_selection
+        if restore_selection and not state.job_id:
+            if not pyp5.get_entries(nsdchat, restore_selection).strip():
+                app_logger.warning(
+                    "Restore selection %s of %s is gone, starting over.",
+                    restore_selection,
+                    names,
+                )
+                restore_selection = ""
+
+        resumed = bool(restore_selection)
+        if not restore_selection:
+            restore_selection = pyp5.new_restore_selection(nsdchat).strip("\n")
+            if not restore_selection:
+                app_logger.critical("Couldn't create restore selection: %s", names)
+                app_logger.info(pyp5.get_error(nsdchat))
+                return None
+            job_journal.append("selection", id=restore_selection)
+
+        file_loggers = {
+            file: logsetup.open_sink(
+                f"FILE:{os.path.basename(file)}",
+                f"{self.current_dir}/logs/{os.path.basename(file)}.log",
+            )
+            for file in files
+        }
+
+        def log(level, msg, *log_args):
+            for file_logger in file_loggers.values():
+                file_logger.log(level, msg, *log_args)
+
+        # --- sinks are reference counted, release them if the search fails
+        try:
+            if resumed:
+                log(logging.INFO, "Resumed RestoreSelection: %s", restore_selection)
+            else:
+                log(logging.INFO, "Created RestoreSelection: %s", restore_selection)
+            if len(files) > 1:
+                log(logging.INFO, "Shared with %s", names)
+
+            # --- search for entries not found by an earlier run, journal progress
+            paths = {}
+            for file in files:
+                paths.update(self.paths.get(file, {}))
+            items = list(
+                dict.fromkeys(
+                    item
+                    for search_items in files_items.values()
+                    for item in search_items
+                )
+            )
+            pending = [item for item in items if not state.found(item)]
+            if len(pending) < len(items):
+                log(
+                    logging.INFO,
+                    "%s of %s items already found by earlier run.",
+                    len(items) - len(pending),
+                    len(items),
+                )
+            if paths and not args.no_exact_paths:
+                log(
+                    logging.INFO,
+                    "Locator paths known for %s of %s items, searching by path first.",
+                    sum(1 for item in items if paths.get(item)),
+                    len(items),
+                )
+            for start in range(0, len(pending), journal.CHUNK):
+                found = self.search(
+                    restore_selection, pending[start:start + journal.CHUNK], paths
+                )
+                job_journal.append("found", results=found)
+            results = {item: state.results.get(item, "") for item in items}
+            for item, result in results.items():
+                print(f"{item}: {result}")
+            for file, search_items in files_items.items():
+                for item in dict.fromkeys(search_items):
+                    if results[item] == "0" or not results[item]:
+                        file_loggers[file].warning("%s not found in archive.", item)
+
+            entries = pyp5.get_entries(nsdchat, restore_selection).strip("\n")
+
+            if not entries or entries == "0":
+                log(logging.CRITICAL, "No entries in Restore Selection.")
+                log(logging.INFO, metrics.summary(metrics.diff(before)))
+                self.close_loggers(file_loggers)
+                return None
+
+            log(logging.INFO, "Added %s entries to Restore Selection", entries)
+
+            # --- get volumes and corresponding labels
+            volumes_list = state.volumes
+            if not volumes_list:
+                volumes = pyp5.get_volumes(nsdchat, restore_selection)
+                if not volumes:
+                    log(logging.CRITICAL, "--- No volumes for restore found! ---")
+                    log(logging.CRITICAL, pyp5.get_error(nsdchat))
+                    log(logging.INFO, metrics.summary(metrics.diff(before)))
+                    self.close_loggers(file_loggers)
+                    return None
+                volumes_list = volumes.strip("\n").split(" ")
+                job_journal.append("volumes", volumes=volumes_list)
+            log(logging.INFO, "--- Volumes needed for restore ---")
+
+            volumes = {}
+
+            # --- metadata of all volumes in one round-trip
+            volume_info = self.volume_cache.get_info(nsdchat, sorted(volumes_list))
+            for volume, info in volume_info.items():
+                volumes[f'"{volume}"'] = f'"{info["label"]}"'
+                log(
+                    logging.INFO,
+                    "%s: %s (barcode %s, pool %s, %s)",
+                    volume,
+                    info["label"],
+                    info["barcode"],
+                    info["pool"],
+                    info["mode"],
+                )
+
+            log(logging.INFO, metrics.summary(metrics.diff(before)))
+            return Job(
+                title,
+                restore_selection,
+                volumes,
+                volumes_list,
+                files,
+                log,
+                file_loggers,
+                job_journal,
+            )
+        except Exception:
+            self.close_loggers(file_loggers)
+            raise
+
+    @staticmethod
+    def close_loggers(file_loggers):
+        """release per-file loggers, closes their log files"""
+        for file_logger in file_loggers.values():
+            logsetup.close_sink(file_logger)
+
+    def queue(self, job):
+        """submit job right away, or hand it to the scheduler"""
+        for file in job.files:
+            self.outstanding[file] = self.outstanding.get(file, 0) + 1
+        if self.scheduler is not None:
+            self.scheduler.add(job, job.volume_ids)
+        else:
+            self.finish(job, self.submit(job))
+
+    def submit(self, job) -> bool:
+        """Submit prepared restore selection if dry-run flag is not set.
+        Returns True if restore job was submitted."""
+        if self.args.dry:
+            return False
+
+        state = job.journal.state
+        if state.job_id:
+            job.log(logging.INFO, "Restore job %s was already submitted.", state.job_id)
+            return True
+        if state.submitting:
+            job.log(
+                logging.CRITICAL,
+                "Submit was interrupted, check the P5 job monitor. "
+                "Remove %s to submit again.",
+                job.journal.file,
+            )
+            return False
+
+        names = ", ".join(f'"{os.path.basename(file)}"' for file in job.files)
+        before = metrics.snapshot()
+        pyp5.describe(self.nsdchat, job.restore_selection, job.title)
+        job.journal.append("submitting")
+        job_id = pyp5.submit_restore(self.nsdchat, job.restore_selection)
+        job.log(logging.INFO, metrics.summary(metrics.diff(before)))
+
+        if not job_id:
+            job.journal.append("submit_failed")
+            job.log(logging.CRITICAL, "Could not submit restore selection!")
+            postbote.send_async(
+                self.mail, "ERROR", f"Could not submit restore selection of {names}."
+            )
+            return False
+
+        job.journal.append("submitted", job_id=job_id)
+        job.log(logging.INFO, "Created restore job with ID %s", job_id)
+
+        # --- send mail with needed volumes
+        message = f"Files: {names}\n\nVolumes needed for restore:\n"
+        for key, value in job.volumes.items():
+            message += f"{key}: {value}\n"
+        postbote.send_async(self.mail, f"Restore {job_id} started", message)
+        return True
+
+    def finish(self, job, submitted):
+        """move files to finished/ once all their jobs are submitted"""
+        self.close_loggers(job.loggers)
+        if submitted:
+            job.journal.remove()
+        for file in job.files:
+            if not submitted:
+                self.failed.add(file)
+            self.outstanding[file] -= 1
+            if self.outstanding[file]:
+                continue
+            del self.outstanding[file]
+            if file in self.failed:
+                self.failed.discard(file)
+            else:
+                self.move(file, "finished")
+
+    def submit_scheduled(self):
+        """submit all scheduled jobs ordered by shared volumes"""
+        if not self.scheduler:
+            return
+        naive, planned = self.scheduler.mounts()
+        self.app_logger.info(
+            "Submitting %s scheduled jobs, expected tape loads: %s (file order: %s)",
+            len(self.scheduler),
+            planned,
+            naive,
+        )
+        for job in self.scheduler.plan():
+            job.log(logging.INFO, "Tape order: %s", " ".join(job.volume_ids))
+            self.finish(job, self.submit(job))
+        self.scheduler.clear()
+
+    def watch(self, stop=None):
+        """process new files in restore/ as they arrive until stop is set"""
+        restore_dir = os.path.join(self.current_dir, "restore")
+        self.app_logger.info("Watching %s for new files.", restore_dir)
+        for file in watcher.watch(restore_dir, set(pyp5.PARSERS), stop=stop):
+            self.app_logger.info('Picked up "%s"', os.path.basename(file))
+            # --- a broken file or a lost P5 connection must not end the watch
+            try:
+                self.refresh_index()
+                self.process(file, self.parse(file))
+            except Exception:
+                self.app_logger.exception(
+                    'Processing "%s" failed', os.path.basename(file)
+                )
+                self.outstanding.pop(file, None)
+                self.failed.discard(file)
+                if os.path.exists(file):
+                    self.move(file, "failed")
+            self.write_metrics()
+
+    def write_metrics(self):
+        """write measurements of this run as JSON and Prometheus textfile"""
+        metrics_dir = self.args.metrics or os.path.join(self.current_dir, "logs")
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            metrics.write_json(os.path.join(metrics_dir, "metrics.json"))
+            metrics.write_prometheus(os.path.join(metrics_dir, "pyp5.prom"))
+        except OSError as error:
+            self.app_logger.error("Could not write metrics: %s", error)
+
+
 def main(current_dir, argv=None) -> int:
     """main function, returns exit code"""
     # --- argument parser to check flags
     parser = argparse.ArgumentParser(
-        description="Restores files supplied via .aaf or .ale"
+        description="Restores files supplied via .aaf, .ale or .edl"
     )
     parser.add_argument(
         "-d",
@@ -72,34 +551,163 @@ def main(current_dir, argv=None) -> int:
         action="store_true",
         help="only send testmail (no execution of script)",
     )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=pyp5.BATCH_SIZE,
+        help="number of items searched per findentry call (default 1), "
+        "larger batches save calls if most items are missing or searched by "
+        "exact path",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of concurrent findentry calls per restore selection",
+    )
+    parser.add_argument(
+        "-i",
+        "--index",
+        metavar="FILE",
+        help="resolve items against local archive index snapshot first "
+        "(needs the P5 server's inventory files, i.e. run on the server)",
+    )
+    parser.add_argument(
+        "--index-ttl",
+        type=int,
+        default=index.TTL,
+        metavar="SECONDS",
+        help="refresh archive index in watch mode once it is older than this",
+    )
+    parser.add_argument(
+        "--index-rebuild",
+        type=int,
+        default=index.REBUILD,
+        metavar="SECONDS",
+        help="rebuild archive index from scratch once the last rebuild is older "
+        "than this (picks up entries with old mtimes and drops deleted ones)",
+    )
+    parser.add_argument(
+        "--volume-ttl",
+        type=int,
+        default=cache.TTL,
+        help="seconds cached volume labels stay valid",
+    )
+    parser.add_argument(
+        "--refresh-volumes",
+        action="store_true",
+        help="drop cached volume labels before run",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="keep running and process new files in restore/ as they arrive",
+    )
+    parser.add_argument(
+        "--merge",
+        metavar="N",
+        type=int,
+        nargs="?",
+        const=1,
+        help="merge items of all files into N shared restore selections "
+        "(not with --watch)",
+    )
+    parser.add_argument(
+        "-s",
+        "--schedule",
+        action="store_true",
+        help="submit restore selections ordered by shared volumes "
+        "(not with --watch)",
+    )
+    parser.add_argument(
+        "--ale-filter",
+        metavar="EXPR",
+        default="",
+        help="only restore ALE rows matching filter, e.g. "
+        "\"Circled = Y and Tape in (A001, A002)\"",
+    )
+    parser.add_argument(
+        "--no-exact-paths",
+        action="store_true",
+        help="search AAF items by name only, ignore essence locator paths",
+    )
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help="always parse input files, do not use ~/.pyp5parsecache",
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=logsetup.MAX_BYTES,
+        help="rotate logs/pyp5.log at this size",
+    )
+    parser.add_argument(
+        "--log-when",
+        metavar="WHEN",
+        help="rotate logs/pyp5.log by time instead (e.g. midnight, W0)",
+    )
+    parser.add_argument(
+        "--log-backups",
+        type=int,
+        default=logsetup.BACKUPS,
+        help="number of rotated logs/pyp5.log files to keep",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="DIR",
+        help="folder for metrics.json and pyp5.prom (default: logs/)",
+    )
     args = parser.parse_args(argv)
+    # --- watch mode handles files one by one as they arrive
+    if args.watch and args.merge:
+        parser.error("--merge can't be used with --watch")
+    if args.watch and args.schedule:
+        parser.error("--schedule can't be used with --watch")
+    if args.ale_filter:
+        try:
+            aletable.Filter(args.ale_filter)
+        except ValueError as error:
+            parser.error(str(error))
 
     # --- create logger
-    app_logger = init_logger(
-            "APP", logging.INFO, f"{current_dir}/logs/pyp5.log"
+    app_logger = logsetup.start(
+        f"{current_dir}/logs/pyp5.log",
+        logging.INFO,
+        args.log_max_bytes,
+        args.log_backups,
+        args.log_when,
     )
 
     # --- try to read config file, check connection
-    archive_id, nsdchat, mail = read_conf()
+    conf = read_conf()
+    archive_id, nsdchat, mail = conf
     if archive_id == "ERROR":
         app_logger.critical(nsdchat)
         return 1
 
     app_logger.info(nsdchat)
+    if session.POOL_SIZE:
+        session.POOL_SIZE = max(session.POOL_SIZE, args.jobs)
 
     if args.mail:
         print(postbote.send(mail, "Test-Mail", "Mail notification works."))
         return 0
 
-    ale_files = list(glob.glob(f'{current_dir}/restore/*.[aA][lL][eE]'))
-    aaf_files = list(glob.glob(f"{current_dir}/restore/*.[aA][aA][fF]"))
-    files = ale_files + aaf_files
+    files = sorted(
+        file
+        for file in glob.glob(f"{current_dir}/restore/*")
+        if os.path.splitext(file)[1].lower() in pyp5.PARSERS
+    )
 
-    if not files:
-        app_logger.warning("No ALE or AAF files found.")
-        print("--------------------------")
-        print("No ALE or AAF files found!")
-        print("--------------------------")
+    if not files and not args.watch:
+        app_logger.warning("No ALE, AAF or EDL files found.")
+        print("---------------------------------")
+        print("No ALE, AAF or EDL files found!")
+        print("---------------------------------")
         return 1
 
     p5_connection = pyp5.check_p5_connection(nsdchat)
@@ -107,98 +715,91 @@ def main(current_dir, argv=None) -> int:
         app_logger.critical(p5_connection)
         return 1
 
-    for file in files:
-        if file.split(".")[1] == "ale":
-            search_items = pyp5.parse_ale(file)
-        else:
-            search_items = pyp5.parse_aaf(file)
-
-        if search_items[0] == "ERROR":
-            app_logger.error('"%s": %s', file, {search_items[1]})
-            os.system(f"mv {file} {current_dir}/failed/")
-            continue
-
-        restore_selection = pyp5.new_restore_selection(nsdchat).strip("\n")
-        if not restore_selection:
-            app_logger.critical("Couldn't create restore selection: %s", file)
-            app_logger.info(pyp5.get_error(nsdchat))
-            continue
-
-        file_logger = init_logger(
-            "FILE",
-            logging.INFO,
-            f"{current_dir}/logs/{os.path.basename(file)}.log"
-        )
-        file_logger.info("Created RestoreSelection: %s", restore_selection)
-
-        # --- search for entries and add to restore selection
-        for item in search_items:
-            result = pyp5.find_entry(
-                nsdchat, restore_selection, archive_id, item
-            ).strip("\n")
-            print(f"{item}: {result}")
-            if result == "0" or not result:
-                file_logger.warning("%s not found in archive.", item)
-
-        entries = (
-            pyp5.check_output(
-                nsdchat + ["-c", "RestoreSelection", restore_selection, "entries"]
-            )
-            .decode("utf-8")
-            .strip("\n")
-        )
-
-        if not entries or entries == "0":
-            file_logger.critical("No entries in Restore Selection.")
-            continue
-
-        file_logger.info("Added %s entries to Restore Selection", entries)
-
-        # --- get volumes and corresponding labels
-        volumes = pyp5.get_volumes(nsdchat, restore_selection)
-        if not volumes:
-            file_logger.critical("--- No volumes for restore found! ---")
-            file_logger.critical(pyp5.get_error(nsdchat))
-            continue
-
-        volumes_list = volumes.strip("\n").split(" ")
-        file_logger.info("--- Volumes needed for restore ---")
-
-        volumes = {}
+    run = RestoreRun(current_dir, args, app_logger, conf)
+    if not run.open_index():
+        return 1
 
-        for volume in sorted(volumes_list):
-            label = pyp5.get_label(nsdchat, volume).strip("\n")
-            volumes[f'"{volume}"'] = f'"{label}"'
-            file_logger.info("%s: %s", volume, label)
+    if args.watch:
+        try:
+            run.watch()
+        except KeyboardInterrupt:
+            app_logger.info("Watch mode stopped.")
+        return 0
 
-        # --- submit selection if dry-run flag is not set
-        if not args.dry:
-            job_id = pyp5.submit_restore(nsdchat, restore_selection)
+    if args.ale_filter:
+        app_logger.info('Restoring ALE rows matching "%s" only.', args.ale_filter)
 
-            if not job_id:
-                file_logger.critical("Could not submit restore selection!")
-                postbote.send(
-                    mail, "ERROR", f'Could not submit restore selection of "{file}".'
+    # --- AAF parsing is slow, parse all uncached ones in parallel up front
+    cached = {}
+    if run.parse_cache is not None:
+        cached = {
+            file: run.parse_cache.lookup(
+                file, parsecache.filter_kind(file, args.ale_filter)
+            )
+            for file in files
+        }
+    # --- AAFs without cached locator paths are parsed again for exact lookups
+    for file in files:
+        if file.lower().endswith(".aaf") and cached.get(file) is not None:
+            if not run.load_paths(file):
+                cached[file] = None
+    aaf_files = [
+        file
+        for file in files
+        if file.lower().endswith(".aaf") and cached.get(file) is None
+    ]
+    aaf_results = pyp5.parse_aafs(aaf_files)
+    for file, (search_items, seconds, paths) in aaf_results.items():
+        app_logger.info('Parsed "%s" in %.2fs', os.path.basename(file), seconds)
+        run.paths[file] = paths
+        if run.parse_cache is not None:
+            run.parse_cache.store(file, search_items)
+            run.parse_cache.store_paths(file, paths)
+
+    files_items = {}
+    for file in files:
+        if cached.get(file) is not None:
+            files_items[file] = cached[file]
+        elif file in aaf_results:
+            files_items[file] = aaf_results[file][0]
+        else:
+            files_items[file] = pyp5.parse_file(file, args.ale_filter)
+            if run.parse_cache is not None:
+                run.parse_cache.store(
+                    file,
+                    files_items[file],
+                    parsecache.filter_kind(file, args.ale_filter),
                 )
-                continue
-
-            file_logger.info("Created restore job with ID %s", job_id)
-
-            # --- send mail with needed volumes
-            message = "Volumes needed for restore:\n"
-            for key, value in volumes.items():
-                message += f"{key}: {value}\n"
-            postbote.send(mail, f"Restore {job_id} started", message)
+    if run.parse_cache is not None:
+        app_logger.info("Parse cache: %s", run.parse_cache.stats())
 
-            os.system(f"mv {file} ../finished")
+    if args.merge:
+        run.process_merged(files_items, args.merge)
+    else:
+        for file, search_items in files_items.items():
+            run.process(file, search_items)
+    run.submit_scheduled()
 
+    app_logger.info("Volume cache: %s", run.volume_cache.stats())
+    app_logger.info(metrics.summary())
+    run.write_metrics()
     return 0
 
 
 if __name__ == "__main__":
+    # --- frozen builds start AAF parser workers by running this executable
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+
     # --- get application/script path
     if getattr(sys, "frozen", False):
         app_dir = os.path.dirname(os.path.dirname(sys.executable))
+        # --- one-dir builds keep the executable in a folder of its own
+        bundle_dir = getattr(sys, "_MEIPASS", "")
+        exe_dir = os.path.dirname(sys.executable)
+        if exe_dir in (bundle_dir, os.path.dirname(bundle_dir)):
+            app_dir = os.path.dirname(app_dir)
     else:
         app_dir = os.path.dirname(sys.path[0])
 
@@ -12,13 +12,20 @@ from tkinter.scrolledtext import ScrolledText
 import configparser
 import datetime as dt
 import os
+import queue
+import threading
 import tkinter as tk
+import cache
+import parsecache
 import postbote
 import pyp5
 
 
 __version__ = "A06"
 
+POLL_INTERVAL = 100
+POLL_BATCH = 1000
+
 
 def get_time():
     """return current time with specific format"""
@@ -39,10 +46,14 @@ class RestoreGUI(tk.Tk):
 
         self.selected_file = str()
         self.entries = set()
+        self.paths = {}
         self.sum_entries = 0
         self.config_file = f"{os.path.expanduser('~')}/.pyp5conf"
 
         self.selected_items = set()
+        self.volume_cache = None
+        self.parse_cache = None
+        self.worker = None
 
         self.bug_report_text = tk.Text()
 
@@ -57,23 +68,21 @@ class RestoreGUI(tk.Tk):
         self.label_entries = tk.Label(
             frame_00, text="Entries found:", background="green", foreground="white"
         )
-        self.label_entries.grid()
+        self.label_entries.grid(row=0, column=0, sticky=tk.W)
+        frame_00.grid_columnconfigure(1, weight=1)
+        self.filter_text = tk.StringVar()
+        self.filter_text.trace_add("write", self.filter_changed)
+        self.entry_filter = tk.Entry(frame_00, textvariable=self.filter_text, width=30)
+        self.entry_filter.grid(row=0, column=1, sticky=tk.E)
 
         frame_10 = tk.Frame(frame_main, background="light blue")
         frame_10.grid(row=1, column=0, columnspan=4, sticky=tk.NSEW)
         frame_10.grid_columnconfigure(0, weight=1)
         self.edit_item = None
-        self.list_entries = tk.Listbox(
-            frame_10, border=0, width=60, height=20, selectmode="multiple"
-        )
-        self.list_entries.configure(font=("Andale Mono", 14))
+        self.list_entries = VirtualList(frame_10, width=60, height=20)
+        self.list_entries.listbox.configure(font=("Andale Mono", 14))
         self.list_entries.grid(column=0, row=0, sticky=tk.W)
-        self.list_entries.bind("<Double-1>", self.start_edit)
-        self.scrollbar_list_entries = tk.Scrollbar(
-            frame_10, orient="vertical", command=self.list_entries.yview()
-        )
-        self.scrollbar_list_entries.grid(column=1, row=0, sticky=tk.NS)
-        self.list_entries["yscrollcommand"] = self.scrollbar_list_entries.set
+        self.list_entries.listbox.bind("<Double-1>", self.start_edit)
 
         # --- LOG OUTPUT
         frame_04 = tk.Frame(frame_main)
@@ -119,8 +128,12 @@ class RestoreGUI(tk.Tk):
         frame_22.grid_columnconfigure(0, weight=1)
         frame_22.grid_rowconfigure(0, weight=1)
         self.button_restore = tk.Button(frame_22, text="Restore", width=8)
-        self.button_restore.grid()
+        self.button_restore.grid(row=0, column=0)
         self.button_restore["command"] = self.restore
+        self.button_cancel = tk.Button(frame_22, text="Cancel", width=8)
+        self.button_cancel.grid(row=0, column=1)
+        self.button_cancel["command"] = self.cancel_restore
+        self.button_cancel["state"] = "disabled"
 
         frame_23 = tk.Frame(frame_main)
         frame_23.grid(row=2, column=3, sticky=tk.NSEW)
@@ -186,6 +199,10 @@ class RestoreGUI(tk.Tk):
         )
         self.label_file.configure(font=("TkDefaultFont", 11))
         self.label_file.grid(row=0, column=0, sticky=tk.W)
+        self.progress_restore = ttk.Progressbar(
+            frame_60, orient="horizontal", mode="determinate", length=200
+        )
+        self.progress_restore.grid(row=0, column=1, sticky=tk.E)
 
         def background_on_enter(event=None):
             self.label_bug_report.configure(background="light grey")
@@ -218,12 +235,16 @@ class RestoreGUI(tk.Tk):
     # === FUNCTIONS ======================================================================
     def start_edit(self, event):
         """Allow editing of configuration file"""
-        index = self.list_entries.index(f"@{event.x},{event.y}")
+        listbox = self.list_entries.listbox
+        row = listbox.index(f"@{event.x},{event.y}")
+        index = self.list_entries.model_index(row)
+        if index is None:
+            return
         self.edit_item = index
-        text = self.list_entries.get(index).strip("\n")
-        y_axis = self.list_entries.bbox(index)[1]
+        text = self.list_entries.items[index]
+        y_axis = listbox.bbox(row)[1]
         self.item_to_edit = tk.Entry(
-            master=self.list_entries, borderwidth=0, highlightthickness=1
+            master=listbox, borderwidth=0, highlightthickness=1
         )
         self.item_to_edit.bind("<Return>", self.save_edit)
         self.item_to_edit.bind("<Escape>", self.cancel_edit)
@@ -242,10 +263,20 @@ class RestoreGUI(tk.Tk):
     def save_edit(self, event):
         """Save edits made on configuration file"""
         new_data = event.widget.get()
-        self.list_entries.delete(self.edit_item)
-        self.list_entries.insert(self.edit_item, new_data)
+        self.list_entries.replace(self.edit_item, new_data)
         event.widget.destroy()
 
+    def filter_changed(self, *args):
+        """Show only entries containing filter text"""
+        self.list_entries.filter(self.filter_text.get())
+        shown = len(self.list_entries.view)
+        if shown == self.sum_entries:
+            self.label_entries.config(text=f"Entries found: {self.sum_entries}")
+        else:
+            self.label_entries.config(
+                text=f"Entries found: {shown} of {self.sum_entries}"
+            )
+
     def archive_id_changed(self, event):
         """Refresh archive id"""
         self.config_change(self.combobox_archvive_id.get())
@@ -323,25 +354,41 @@ class RestoreGUI(tk.Tk):
         if not self.selected_file:
             return
 
-        if self.selected_file.split(".")[1] == "ale":
-            self.entries = set(pyp5.parse_ale(self.selected_file))
-        elif self.selected_file.split(".")[1] == "aaf":
-            self.entries = set(pyp5.parse_aaf(self.selected_file))
-        elif self.selected_file.split(".")[1] == "edl":
-            self.entries = set(pyp5.parse_edl(self.selected_file))
+        if self.parse_cache is None:
+            self.parse_cache = parsecache.ParseCache()
+        # --- [RESTORE] ale_filter = Circled = Y and Tape ~ 'A00*'
+        ale_filter = self.config_parser.get(
+            "RESTORE", "ale_filter", raw=True, fallback=""
+        ).strip()
+        paths = {}
+        if self.selected_file.lower().endswith(".aaf"):
+            search_items = self.parse_cache.lookup(self.selected_file)
+            paths = self.parse_cache.lookup_paths(self.selected_file)
+            if search_items is None or paths is None:
+                search_items, paths = pyp5.parse_aaf_paths(self.selected_file)
+                self.parse_cache.store(self.selected_file, search_items)
+                self.parse_cache.store_paths(self.selected_file, paths)
+        else:
+            search_items = self.parse_cache.parse(self.selected_file, ale_filter)
 
-        if "ERROR" in self.entries:
+        if search_items[:1] == ["ERROR"]:
             self.text_log_output.insert(
                 tk.INSERT,
                 f"[{get_time()}] '{os.path.basename(self.selected_file)}': "
-                f"{': '.join(self.entries)}\n",
+                f"{': '.join(search_items)}\n",
             )
             return
+        self.entries = set(search_items)
+        # --- keyed like the list shows items, restore gets these back
+        self.paths = {
+            item.split(".")[0]: item_paths for item, item_paths in paths.items()
+        }
 
-        self.list_entries.delete(0, tk.END)
         self.text_log_output.delete("1.0", tk.END)
-        for item in sorted(list(self.entries)):
-            self.list_entries.insert(tk.END, item.split(".")[0] + "\n")
+        self.filter_text.set("")
+        self.list_entries.set_items(
+            [item.split(".")[0] for item in sorted(self.entries)]
+        )
 
         self.sum_entries = len(self.entries)
 
@@ -351,6 +398,10 @@ class RestoreGUI(tk.Tk):
             f"[{get_time()}] Opened file: "
             f'"{os.path.basename(self.selected_file)}"\n',
         )
+        if ale_filter and self.selected_file.lower().endswith(".ale"):
+            self.text_log_output.insert(
+                tk.INSERT, f'[{get_time()}] Rows matching "{ale_filter}" only.\n'
+            )
         self.text_log_output.insert(
             tk.INSERT, f"[{get_time()}] Found {self.sum_entries} entries in file.\n"
         )
@@ -361,19 +412,14 @@ class RestoreGUI(tk.Tk):
         self.label_file.config(text=f"Current file: '{self.selected_file}'")
 
     def restore(self):
-        """start restore of selected entries"""
+        """start restore of selected entries in background worker"""
         search_items = []
 
         # self.selected_items = self.list_entries.curselection()
         self.text_log_output.delete("1.0", tk.END)
 
-        for i in self.list_entries.curselection():
-            search_items.append(self.list_entries.get(i).strip())
-
-        archive_id = self.config_parser.get("RESTORE", "archive_id")
-        nsdchat = [
-            self.config_parser.get("GENERAL", "nsdchat")
-        ] + self.config_parser.get("GENERAL", "awsock").split()
+        for item in self.list_entries.selected_items():
+            search_items.append(item.strip())
 
         # are there any items to search?
         if len(search_items) == 0:
@@ -382,130 +428,393 @@ class RestoreGUI(tk.Tk):
             )
             return
 
+        if self.volume_cache is None:
+            self.volume_cache = cache.VolumeCache(
+                ttl=self.config_parser.getint("RESTORE", "volume_ttl", fallback=cache.TTL)
+            )
+
+        self.worker = RestoreWorker(
+            self.config_parser,
+            search_items,
+            os.path.basename(self.selected_file),
+            self.volume_cache,
+            dry_run=bool(self.check_dryrun_state.get()),
+            send_mail=bool(self.check_mail_state.get()),
+            paths=self.paths,
+        )
+        self.button_restore["state"] = "disabled"
+        self.button_cancel["state"] = "normal"
+        self.progress_restore["value"] = 0
+        self.worker.start()
+        self.after(POLL_INTERVAL, self.poll_worker)
+
+    def cancel_restore(self):
+        """ask running restore worker to stop"""
+        if self.worker is not None:
+            self.worker.cancel.set()
+            self.button_cancel["state"] = "disabled"
+
+    def poll_worker(self):
+        """apply queued worker messages in one batch per timer tick"""
+        lines = []
+        finished = False
+        for _ in range(POLL_BATCH):
+            try:
+                kind, *values = self.worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                lines.append(values[0])
+            elif kind == "progress":
+                self.progress_restore["maximum"] = max(values[1], 1)
+                self.progress_restore["value"] = values[0]
+            elif kind == "done":
+                finished = True
+
+        if lines:
+            self.text_log_output.insert(tk.END, "".join(lines))
+            self.text_log_output.yview(tk.END)
+
+        if finished:
+            self.worker = None
+            self.button_restore["state"] = "normal"
+            self.button_cancel["state"] = "disabled"
+        else:
+            self.after(POLL_INTERVAL, self.poll_worker)
+
+    def save_logfile(self):
+        """save contents of log box to file"""
+        output = self.text_log_output.get("1.0", tk.END).strip()
+        if not output:
+            mb.showerror("Error", "Nothing to save.", parent=self)
+            return
+
+        with open(
+            f"{os.path.expanduser('~')}/pyp5_restore-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.log",
+            "w",
+            encoding="utf-8"
+        ) as log_file:
+            log_file.write(output)
+            mb.showinfo(
+                "Information",
+                f'Logfile saved to {os.path.expanduser("~")}',
+                parent=self,
+            )
+
+
+class EntryIndex:
+    """Trigram index over a list of strings for fast substring filtering.
+    Built on first use, so loading a file doesn't pay for it."""
+
+    def __init__(self, items):
+        self.items = items
+        self.trigrams = None
+
+    @staticmethod
+    def grams(text) -> set:
+        """all trigrams of lower-cased text"""
+        text = text.lower()
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def build(self):
+        """index all items"""
+        self.trigrams = {}
+        for index, item in enumerate(self.items):
+            self.add(index, item)
+
+    def add(self, index, item):
+        """add item at index to trigram sets"""
+        if self.trigrams is None:
+            return
+        for gram in self.grams(item):
+            self.trigrams.setdefault(gram, set()).add(index)
+
+    def remove(self, index, item):
+        """remove item at index from trigram sets"""
+        if self.trigrams is None:
+            return
+        for gram in self.grams(item):
+            self.trigrams.get(gram, set()).discard(index)
+
+    def search(self, query) -> list:
+        """indexes of items containing query (case-insensitive), in order"""
+        query = query.lower()
+        if not query:
+            return list(range(len(self.items)))
+        grams = self.grams(query)
+        if grams:
+            if self.trigrams is None:
+                self.build()
+            candidates = set.intersection(
+                *(self.trigrams.get(gram, set()) for gram in grams)
+            )
+        else:
+            candidates = range(len(self.items))
+        return sorted(
+            index for index in candidates if query in self.items[index].lower()
+        )
+
+
+class VirtualList(tk.Frame):
+    """Listbox that only holds the visible rows of a large list of items.
+    Filtering and multi-selection work on the underlying model."""
+
+    def __init__(self, master, width, height):
+        super().__init__(master)
+        self.rows = height
+        self.items = []
+        self.index = EntryIndex(self.items)
+        self.view = []
+        self.top = 0
+        self.selected = set()
+
+        self.listbox = tk.Listbox(
+            self,
+            border=0,
+            width=width,
+            height=height,
+            selectmode="multiple",
+            exportselection=False,
+        )
+        self.listbox.grid(column=0, row=0, sticky=tk.W)
+        self.listbox.bind("<<ListboxSelect>>", self.selection_changed)
+        self.listbox.bind("<MouseWheel>", self.wheel)
+        self.listbox.bind("<Button-4>", self.wheel)
+        self.listbox.bind("<Button-5>", self.wheel)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.grid(column=1, row=0, sticky=tk.NS)
+
+    def set_items(self, items):
+        """replace all items, clears selection and filter"""
+        self.items = list(items)
+        self.index = EntryIndex(self.items)
+        self.view = list(range(len(self.items)))
+        self.selected = set()
+        self.top = 0
+        self.render()
+
+    def filter(self, query):
+        """show only items containing query"""
+        self.view = self.index.search(query)
+        self.top = 0
+        self.render()
+
+    def replace(self, index, text):
+        """change text of item at model index"""
+        self.index.remove(index, self.items[index])
+        self.items[index] = text
+        self.index.add(index, text)
+        self.render()
+
+    def model_index(self, row):
+        """model index of visible listbox row, None for empty rows"""
+        position = self.top + row
+        return self.view[position] if position < len(self.view) else None
+
+    def selected_items(self) -> list:
+        """selected items in model order"""
+        return [self.items[index] for index in sorted(self.selected)]
+
+    def render(self):
+        """fill listbox with visible window of filtered items"""
+        window = self.view[self.top:self.top + self.rows]
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *(self.items[index] for index in window))
+        for row, index in enumerate(window):
+            if index in self.selected:
+                self.listbox.selection_set(row)
+        total = max(len(self.view), 1)
+        self.scrollbar.set(self.top / total, (self.top + len(window)) / total)
+
+    def scroll_to(self, top):
+        """move visible window, top is clamped to valid range"""
+        top = max(0, min(int(top), len(self.view) - self.rows))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def yview(self, *args):
+        """scrollbar callback ('moveto' fraction or 'scroll' n units/pages)"""
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * len(self.view))
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def wheel(self, event):
+        """scroll with mouse wheel"""
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+    def selection_changed(self, event=None):
+        """sync listbox selection of visible rows into model selection"""
+        current = set(self.listbox.curselection())
+        for row in range(self.listbox.size()):
+            index = self.model_index(row)
+            if row in current:
+                self.selected.add(index)
+            else:
+                self.selected.discard(index)
+
+
+class RestoreWorker(threading.Thread):
+    """runs restore pipeline off the Tk main thread, reports via queue"""
+
+    def __init__(
+        self,
+        config_parser,
+        search_items,
+        title,
+        volume_cache,
+        dry_run,
+        send_mail,
+        paths=None,
+    ):
+        super().__init__(daemon=True)
+        self.archive_id = config_parser.get("RESTORE", "archive_id")
+        self.nsdchat = [config_parser.get("GENERAL", "nsdchat")] + config_parser.get(
+            "GENERAL", "awsock"
+        ).split()
+        self.batch_size = config_parser.getint(
+            "RESTORE", "batch_size", fallback=pyp5.BATCH_SIZE
+        )
+        self.mail = list(config_parser.get("NOTIFICATION", "email").split(","))
+        self.search_items = [item.strip() for item in search_items]
+        self.paths = paths or {}
+        self.title = title
+        self.volume_cache = volume_cache
+        self.dry_run = dry_run
+        self.send_mail = send_mail
+        self.messages = queue.Queue()
+        self.cancel = threading.Event()
+        self.lines = []
+
+    def log(self, text):
+        """queue log line for the Tk side"""
+        self.lines.append(text)
+        self.messages.put(("log", text))
+
+    def progress(self, done, total):
+        """queue progress update for the Tk side"""
+        self.messages.put(("progress", done, total))
+
+    def run(self):
+        try:
+            self.restore()
+        except Exception as error:
+            self.log(f"[{get_time()}] ERROR: {error}\n")
+        finally:
+            self.messages.put(("done",))
+
+    def cancelled(self, restore_selection) -> bool:
+        """destroy restore selection if cancel was requested"""
+        if not self.cancel.is_set():
+            return False
+        pyp5.destroy(self.nsdchat, restore_selection)
+        self.log(f"\n[{get_time()}] WARNING: Restore cancelled.\n")
+        return True
+
+    def restore(self):
+        """search entries, resolve volumes and submit restore selection"""
+        nsdchat = self.nsdchat
+        archive_id = self.archive_id
+
         # check connection
         p5_connection = pyp5.check_p5_connection(nsdchat)
         if p5_connection:
-            self.text_log_output.insert(tk.END, f"[{get_time()}] {p5_connection}\n")
+            self.log(f"[{get_time()}] {p5_connection}\n")
             return
 
         # try to create restore selection
         restore_selection = pyp5.new_restore_selection(nsdchat).strip("\n")
         if not restore_selection:
-            self.text_log_output.insert(
-                tk.END, f"[{get_time()}] ERROR: Could not create restore selection.\n"
-            )
+            self.log(f"[{get_time()}] ERROR: Could not create restore selection.\n")
             return
 
-        self.text_log_output.insert(
-            tk.END, f"\n[{get_time()}] INFO: Created {restore_selection}\n"
-        )
-        self.text_log_output.insert(
-            tk.END, f"[{get_time()}] INFO: Restoring from archive id {archive_id}\n\n"
-        )
-
-        # --- search for entries and add to restore selection
-        for item in search_items:
-            self.update()
-            result = pyp5.find_entry(
-                nsdchat, restore_selection, archive_id, item.strip()
-            ).strip("\n")
-            if result == "0" or not result:
-                self.text_log_output.insert(
-                    tk.END, f"[{get_time()}] {item.strip()} not found.\n"
+        self.log(f"\n[{get_time()}] INFO: Created {restore_selection}\n")
+        self.log(f"[{get_time()}] INFO: Restoring from archive id {archive_id}\n\n")
+
+        # --- search for entries in chunks to report progress and allow cancel
+        total = len(self.search_items)
+        chunk = max(self.batch_size, 1)
+        for start in range(0, total, chunk):
+            if self.cancelled(restore_selection):
+                return
+            if self.paths:
+                results = pyp5.find_entries_exact(
+                    nsdchat,
+                    restore_selection,
+                    archive_id,
+                    self.search_items[start:start + chunk],
+                    self.paths,
+                    self.batch_size,
                 )
             else:
-                self.text_log_output.insert(
-                    tk.END, f"[{get_time()}] {item.strip()}: {result}\n"
+                results = pyp5.find_entries(
+                    nsdchat,
+                    restore_selection,
+                    archive_id,
+                    self.search_items[start:start + chunk],
+                    self.batch_size,
                 )
-            self.text_log_output.yview(tk.END)
+            for item, result in results.items():
+                if result == "0" or not result:
+                    self.log(f"[{get_time()}] {item} not found.\n")
+                else:
+                    self.log(f"[{get_time()}] {item}: {result}\n")
+            self.progress(min(start + chunk, total), total)
+
+        if self.cancelled(restore_selection):
+            return
 
-        entries = (
-            pyp5.check_output(
-                nsdchat + ["-c", "RestoreSelection", restore_selection, "entries"]
-            )
-            .decode("utf-8")
-            .strip("\n")
-        )
+        entries = pyp5.get_entries(nsdchat, restore_selection).strip("\n")
         if not entries or entries == "0":
-            self.text_log_output.insert(
-                tk.END, f"\n[{get_time()}] WARNING: No entries in {restore_selection}\n"
-            )
+            self.log(f"\n[{get_time()}] WARNING: No entries in {restore_selection}\n")
             return
 
-        self.text_log_output.insert(
-            tk.END,
-            f"\n[{get_time()}] INFO: Added {entries} items to {restore_selection}\n",
-        )
+        self.log(f"\n[{get_time()}] INFO: Added {entries} items to {restore_selection}\n")
 
         volumes = pyp5.get_volumes(nsdchat, restore_selection)
         if not volumes:
-            self.text_log_output.insert(
-                tk.END,
-                f"[{get_time()}] ERROR: No volumes found for {restore_selection}.\n",
-            )
+            self.log(f"[{get_time()}] ERROR: No volumes found for {restore_selection}.\n")
             return
 
         volumes_list = volumes.strip("\n").split(" ")
 
-        self.text_log_output.insert(
-            tk.END, f"\n[{get_time()}] INFO: Volumes needed for restore:\n"
-        )
-        for volume in sorted(volumes_list):
-            self.update()
-            # label = pyp5.get_label(nsdchat, volume).strip("\n")
-            barcode = pyp5.get_barcode(nsdchat, volume).strip("\n")
-            self.text_log_output.insert(tk.END, f"[{get_time()}] {volume}: {barcode}\n")
-
-        title = pyp5.describe(
-            nsdchat, restore_selection, os.path.basename(self.selected_file)
-        )
+        self.log(f"\n[{get_time()}] INFO: Volumes needed for restore:\n")
+        volume_info = self.volume_cache.get_info(nsdchat, sorted(volumes_list))
+        for volume, info in volume_info.items():
+            self.log(
+                f"[{get_time()}] {volume}: {info['barcode']} "
+                f"({info['label']}, {info['pool']}, {info['mode']})\n"
+            )
+
+        if self.cancelled(restore_selection):
+            return
+
+        title = pyp5.describe(nsdchat, restore_selection, self.title)
 
-        if not self.check_dryrun_state.get():
+        if not self.dry_run:
             job_id = pyp5.submit_restore(nsdchat, restore_selection)
             if not job_id:
-                self.text_log_output.insert(
-                    tk.END,
-                    f"\n[{get_time()}] ERROR: Could not submit {restore_selection}.\n",
+                self.log(
+                    f"\n[{get_time()}] ERROR: Could not submit {restore_selection}.\n"
                 )
             else:
-                self.text_log_output.insert(
-                    tk.END,
+                self.log(
                     f"\n[{get_time()}] INFO: Created restore job {job_id} named "
-                    f'"{title}".\n',
+                    f'"{title}".\n'
                 )
         else:
-            self.text_log_output.insert(
-                tk.END, f"\n[{get_time()}] INFO: Dry run finished.\n"
-            )
+            self.log(f"\n[{get_time()}] INFO: Dry run finished.\n")
             # print(pyp5.destroy(nsdchat, restore_selection))
 
-        if self.check_mail_state.get():
-            content = self.text_log_output.get("1.0", tk.END).strip()
-            postbote.send(
-                list(self.config_parser.get("NOTIFICATION", "email").split(",")),
-                f"Log Output: {os.path.basename(self.selected_file)}",
-                content,
-            )
-
-        self.text_log_output.yview(tk.END)
-
-    def save_logfile(self):
-        """save contents of log box to file"""
-        output = self.text_log_output.get("1.0", tk.END).strip()
-        if not output:
-            mb.showerror("Error", "Nothing to save.", parent=self)
-            return
-
-        with open(
-            f"{os.path.expanduser('~')}/pyp5_restore-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.log",
-            "w",
-            encoding="utf-8"
-        ) as log_file:
-            log_file.write(output)
-            mb.showinfo(
-                "Information",
-                f'Logfile saved to {os.path.expanduser("~")}',
-                parent=self,
+        if self.send_mail:
+            postbote.send_async(
+                self.mail, f"Log Output: {self.title}", "".join(self.lines).strip()
             )
 
 
@@ -553,7 +862,7 @@ class BugReport(tk.Tk):
                 + "\n\n--------------------\n\n"
                 + self.text_log_output.get("1.0", tk.END)
             )
-            postbote.send(
+            postbote.send_async(
                 "insert_mail_here", "BUG REPORT: p5_restore_gui", message
             )
             self.destroy()
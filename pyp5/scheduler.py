@@ -0,0 +1,121 @@
+"""
+pyp5 - scheduler
+Order queued restore jobs so jobs sharing tapes run back to back.
+
+Jobs are grouped by overlapping volume sets, inside a group the next job
+is always the one sharing most volumes with the job before, starting with
+whichever job gives the fewest loads. Plans that are not better than the
+order the jobs came in are dropped. Mounts are
+estimated with a simple model: the volumes of the previous job are still
+loaded, every other volume needs a tape load.
+"""
+
+
+def count_mounts(volume_sets) -> int:
+    """number of tape loads when jobs with supplied volumes run in order"""
+    mounts = 0
+    loaded = set()
+    for volumes in volume_sets:
+        mounts += len(set(volumes) - loaded)
+        loaded = set(volumes)
+    return mounts
+
+
+def group(volume_sets) -> list:
+    """Indexes of volume sets grouped by overlapping volumes (connected
+    components), groups in order of their first member."""
+    parent = list(range(len(volume_sets)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owner = {}
+    for index, volumes in enumerate(volume_sets):
+        for volume in volumes:
+            if volume in owner:
+                parent[find(index)] = find(owner[volume])
+            else:
+                owner[volume] = index
+
+    groups = {}
+    for index in range(len(volume_sets)):
+        groups.setdefault(find(index), []).append(index)
+    return sorted(groups.values(), key=lambda members: members[0])
+
+
+def chain(volume_sets, members, start) -> list:
+    """greedy order of group members beginning with start, the next job is
+    always the one sharing most volumes with the job before"""
+    remaining = list(members)
+    current = start
+    result = []
+    while True:
+        remaining.remove(current)
+        result.append(current)
+        if not remaining:
+            return result
+        loaded = volume_sets[current]
+        current = max(
+            remaining,
+            key=lambda index: (
+                len(volume_sets[index] & loaded),
+                -len(volume_sets[index] - loaded),
+                -index,
+            ),
+        )
+
+
+def order(volume_sets) -> list:
+    """Returns indexes of volume sets in an order with few tape loads
+    (greedy from every possible start, not guaranteed optimal). The given
+    order is kept unless the plan needs strictly fewer tape loads."""
+    volume_sets = [set(volumes) for volumes in volume_sets]
+    result = []
+
+    for members in group(volume_sets):
+        candidates = [chain(volume_sets, members, start) for start in members]
+        result += min(
+            candidates,
+            key=lambda candidate: count_mounts(
+                [volume_sets[index] for index in candidate]
+            ),
+        )
+
+    if count_mounts([volume_sets[index] for index in result]) < count_mounts(
+        volume_sets
+    ):
+        return result
+    return list(range(len(volume_sets)))
+
+
+class Scheduler:
+    """collects pending jobs with their volumes and plans their order"""
+
+    def __init__(self):
+        self.jobs = []
+        self.volume_sets = []
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def add(self, job, volumes):
+        """queue job needing supplied volumes"""
+        self.jobs.append(job)
+        self.volume_sets.append(set(volumes))
+
+    def plan(self) -> list:
+        """queued jobs in submission order"""
+        return [self.jobs[index] for index in order(self.volume_sets)]
+
+    def mounts(self) -> tuple:
+        """expected tape loads for (naive order, planned order)"""
+        planned = [self.volume_sets[index] for index in order(self.volume_sets)]
+        return count_mounts(self.volume_sets), count_mounts(planned)
+
+    def clear(self):
+        """drop all queued jobs"""
+        self.jobs = []
+        self.volume_sets = []
@@ -0,0 +1,291 @@
+"""
+pyp5 - session
+Pool of long-lived interactive nsdchat processes.
+
+Instead of forking a new nsdchat (and doing a new awsock login) for every
+command, commands are written to the stdin of an already running nsdchat
+and its reply is read back from stdout. Several commands can be written
+at once and their replies read back in order (run_many), one round-trip
+for all of them.
+
+Every command is followed by "echo <marker>" and its reply is read up to
+the marker, so empty or multi-line replies never shift the replies of
+later commands. nsdchat versions not echoing the marker fall back to one
+line per command: an unexpected reply to the probe is taken as the reply
+of echo, a probe without reply within PROBE_TIMEOUT restarts the process
+without markers. The result is remembered per nsdchat command line. A
+session not replying within REPLY_TIMEOUT is killed.
+"""
+
+from subprocess import DEVNULL, PIPE, Popen
+import atexit
+import itertools
+import os
+import queue
+import threading
+
+
+POOL_SIZE = 4
+TIMEOUT = 10
+# --- seconds to wait for the next line of a reply, findentry can be slow
+REPLY_TIMEOUT = 120
+# --- seconds to wait for the echo probe of a new session
+PROBE_TIMEOUT = 5
+
+_framing = {}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def quote(arg) -> str:
+    """quote single argument for the interactive nsdchat shell"""
+    arg = str(arg)
+    if arg.startswith("{") and arg.endswith("}"):
+        return arg
+    if not arg or any(char.isspace() for char in arg):
+        return f"{{{arg}}}"
+    return arg
+
+
+class SessionError(OSError):
+    """raised when an nsdchat session died or did not reply"""
+
+    def __init__(self, message, sent=False):
+        super().__init__(message)
+        self.sent = sent
+
+
+class Session:
+    """single interactive nsdchat process"""
+
+    def __init__(self, nsdchat, timeout=None):
+        self.timeout = REPLY_TIMEOUT if timeout is None else timeout
+        self.nsdchat = list(nsdchat)
+        self.prefix = f"pyp5-{os.getpid()}-{id(self):x}-"
+        self.counter = itertools.count()
+        self.start()
+        key = tuple(self.nsdchat)
+        self.framed = _framing.get(key)
+        if self.framed is None:
+            try:
+                self.framed = _framing[key] = self.probe()
+            except SessionError as error:
+                # --- nothing but the probe was sent, the pool may retry
+                error.sent = False
+                raise
+
+    def start(self):
+        """start nsdchat process and thread reading its output"""
+        self.process = Popen(
+            self.nsdchat,
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=DEVNULL,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        # --- lines are read by a thread, so waiting for them can time out
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self.read_lines, daemon=True)
+        self.reader.start()
+
+    def probe(self) -> bool:
+        """Check if nsdchat echoes reply markers. If it stays silent, the
+        process is restarted, a late reply would shift all later replies."""
+        marker = self.marker()
+        self.write([("echo", marker)])
+        try:
+            line = self.lines.get(timeout=PROBE_TIMEOUT)
+        except queue.Empty:
+            self.kill()
+            self.reader.join(timeout=TIMEOUT)
+            self.process.stdout.close()
+            self.start()
+            return False
+        if line is None:
+            self.lines.put(None)
+            self.process.wait()
+            raise SessionError(f"nsdchat exited with code {self.process.returncode}")
+        return line.strip() == marker
+
+    def read_lines(self):
+        """reader thread, queues lines of stdout, None at end of output"""
+        try:
+            for line in self.process.stdout:
+                self.lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self.lines.put(None)
+
+    def marker(self) -> str:
+        """unique marker ending the reply of a single command"""
+        return f"{self.prefix}{next(self.counter)}"
+
+    def alive(self) -> bool:
+        """check if nsdchat process is still running"""
+        return self.process.poll() is None
+
+    def kill(self):
+        """stop nsdchat process that does not answer"""
+        self.process.kill()
+        self.process.wait()
+
+    def write(self, commands):
+        """write commands to nsdchat"""
+        try:
+            self.process.stdin.write(
+                "".join(
+                    " ".join(quote(arg) for arg in args) + "\n" for args in commands
+                )
+            )
+            self.process.stdin.flush()
+        except (BrokenPipeError, ValueError) as error:
+            raise SessionError(f"nsdchat session closed: {error}") from error
+
+    def next_line(self) -> str:
+        """next line of output, raises SessionError if nsdchat exited or did
+        not reply in time (the session is killed then)"""
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            self.kill()
+            raise SessionError(
+                f"nsdchat did not reply within {self.timeout}s", sent=True
+            ) from None
+        if line is None:
+            self.lines.put(None)
+            self.process.wait()
+            raise SessionError(
+                f"nsdchat exited with code {self.process.returncode}", sent=True
+            )
+        return line
+
+    def run(self, args) -> str:
+        """send command to nsdchat, returns reply including trailing newline"""
+        return self.run_many([args])[0]
+
+    def run_many(self, commands) -> list:
+        """Send all commands to nsdchat at once, returns their replies
+        including trailing newlines in order."""
+        if not self.alive():
+            raise SessionError("nsdchat session not running")
+        if not self.framed:
+            self.write(commands)
+            return [self.next_line() for _ in commands]
+
+        markers = [self.marker() for _ in commands]
+        framed = []
+        for args, marker in zip(commands, markers):
+            framed += [args, ("echo", marker)]
+        self.write(framed)
+
+        replies = []
+        for marker in markers:
+            lines = []
+            while True:
+                line = self.next_line()
+                if line.strip() == marker:
+                    break
+                lines.append(line)
+            replies.append("".join(lines))
+        return replies
+
+    def close(self):
+        """ask nsdchat to exit, kill it if it does not"""
+        try:
+            self.process.stdin.write("exit\n")
+            self.process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        try:
+            self.process.wait(timeout=TIMEOUT)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+        self.reader.join(timeout=TIMEOUT)
+        self.process.stdout.close()
+
+
+class SessionPool:
+    """small pool of nsdchat sessions sharing the same connection options"""
+
+    def __init__(self, nsdchat, size=None):
+        self.nsdchat = list(nsdchat)
+        # --- POOL_SIZE is read now, callers raise it after import (--jobs)
+        self.size = max(1, POOL_SIZE if size is None else size)
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.idle = queue.LifoQueue()
+        self.closed = False
+
+    def acquire(self) -> Session:
+        """get an idle session, start a new one if none is left"""
+        self.slots.acquire()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return Session(self.nsdchat)
+        except OSError:
+            self.slots.release()
+            raise
+
+    def release(self, session, broken=False):
+        """hand session back to pool, broken sessions are discarded"""
+        if broken or self.closed or not session.alive():
+            session.close()
+        else:
+            self.idle.put(session)
+        self.slots.release()
+
+    def run(self, args) -> str:
+        """run single command on a pooled session"""
+        return self.run_many([args])[0]
+
+    def run_many(self, commands) -> list:
+        """Run commands back to back on one pooled session, returns replies.
+        A session that died while idle gets replaced once."""
+        for attempt in range(2):
+            session = self.acquire()
+            try:
+                replies = session.run_many(commands)
+            except SessionError as error:
+                self.release(session, broken=True)
+                # --- never repeat a command that may have reached the server
+                if attempt or error.sent:
+                    raise
+                continue
+            self.release(session)
+            return replies
+        raise SessionError("could not start nsdchat session")
+
+    def close(self):
+        """terminate all idle sessions"""
+        self.closed = True
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            session.close()
+
+
+def get_pool(nsdchat) -> SessionPool:
+    """return shared pool for supplied nsdchat command line"""
+    key = tuple(nsdchat)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = SessionPool(nsdchat)
+        return pool
+
+
+@atexit.register
+def close_all():
+    """terminate sessions of all pools"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,143 @@
+"""
+pyp5 - watcher
+Watch a folder for new files and hand them over once they are complete.
+
+Uses inotify on Linux and falls back to polling everywhere else. A file
+counts as complete when its size and modification time did not change for
+a few seconds, so half-copied lists are never picked up.
+"""
+
+import os
+import select
+import struct
+import time
+
+
+INTERVAL = 2.0
+SETTLE = 5.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """minimal inotify binding via ctypes, raises OSError where unavailable"""
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (AttributeError, OSError, TypeError) as error:
+            raise OSError(f"inotify not available: {error}") from error
+
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self.directory = directory
+
+    def read(self, timeout) -> set:
+        """wait up to timeout seconds, returns paths of changed files"""
+        paths = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return paths
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return paths
+
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                paths.add(os.path.join(self.directory, os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        """stop watching"""
+        os.close(self.fd)
+
+
+def scan(directory, extensions) -> set:
+    """paths of all files in directory with one of the supplied extensions"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return set()
+    return {
+        os.path.join(directory, name)
+        for name in names
+        if os.path.splitext(name)[1].lower() in extensions
+    }
+
+
+def signature(path):
+    """size and mtime of file, None if it vanished"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def watch(directory, extensions, interval=INTERVAL, settle=SETTLE, stop=None):
+    """Yield files in directory as soon as they finished being written.
+    Files already present are yielded too, a file is yielded again only if
+    it changed. Runs until stop (threading.Event) is set."""
+    try:
+        inotify = Inotify(directory)
+    except OSError:
+        inotify = None
+
+    pending = {}
+    yielded = {}
+    candidates = scan(directory, extensions)
+
+    try:
+        while stop is None or not stop.is_set():
+            now = time.monotonic()
+            for path in candidates:
+                if os.path.splitext(path)[1].lower() in extensions:
+                    pending.setdefault(path, (None, now))
+
+            for path, (last, since) in list(pending.items()):
+                current = signature(path)
+                if current is None:
+                    del pending[path]
+                elif current != last:
+                    pending[path] = (current, now)
+                elif now - since >= settle:
+                    del pending[path]
+                    if yielded.get(path) != current:
+                        yielded[path] = current
+                        yield path
+
+            for path in [path for path in yielded if not os.path.exists(path)]:
+                del yielded[path]
+
+            # --- re-check pending files quickly, otherwise wait for changes
+            timeout = min(interval, settle) if pending else interval
+            if inotify is not None:
+                candidates = inotify.read(timeout)
+            else:
+                time.sleep(timeout)
+                candidates = {
+                    path
+                    for path in scan(directory, extensions)
+                    if path not in pending and yielded.get(path) != signature(path)
+                }
+    finally:
+        if inotify is not None:
+            inotify.close()